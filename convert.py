@@ -21,6 +21,12 @@ def check_dependencies():
     except ImportError:
         missing_deps.append("Pillow (PIL) - для работы с изображениями")
     
+    # Проверка numpy
+    try:
+        import numpy
+    except ImportError:
+        missing_deps.append("numpy - для хранения слов с координатами после OCR")
+    
     # Проверка olefile (для DOC файлов, опционально)
     olefile_available = False
     try:
@@ -142,6 +148,8 @@ def check_dependencies():
             print("\n• pypdf:  pip install pypdf")
         if "Pillow" in str(missing_deps):
             print("\n• Pillow: pip install Pillow")
+        if "numpy" in str(missing_deps):
+            print("\n• numpy:  pip install numpy")
         if "pytesseract" in str(missing_deps):
             print("\n• pytesseract: pip install pytesseract")
         
@@ -173,9 +181,13 @@ def check_dependencies():
 
 # Проверяем зависимости перед импортом функций
 if check_dependencies():
-    from func.pdftoimg import extract_images_from_pdf
-    from func.doctoimg import extract_images_from_doc
+    from func.formats import extract_images, EXTENSION_FORMATS
+    from func.archives import extract_images_from_archive, ARCHIVE_EXTENSIONS
     from func.imgtotext import get_image_folders, extract_text_from_images
+    from func.textindex import open_index, index_folder, search
+    from func.imghash import find_duplicates
+    from func.scheduler import run_pipeline
+    from func.pack import PackWriter, PACK_EXT
 
 
 def clear_screen():
@@ -184,20 +196,18 @@ def clear_screen():
 
 
 def get_documents():
-    """Получает список документов (PDF, DOC, DOCX) в текущей директории"""
+    """Получает список документов (PDF, DOC, DOCX, XLSX, PPTX, ODT, RTF) и архивов с ними в текущей директории"""
     documents = []
     
-    # Ищем PDF файлы
-    pdf_files = glob.glob('*.pdf')
-    documents.extend([(f, 'pdf') for f in pdf_files])
+    # Ищем документы всех поддерживаемых форматов
+    for ext, file_type in EXTENSION_FORMATS.items():
+        files = glob.glob(f'*{ext}')
+        documents.extend([(f, file_type) for f in files])
     
-    # Ищем DOC файлы
-    doc_files = glob.glob('*.doc')
-    documents.extend([(f, 'doc') for f in doc_files])
-    
-    # Ищем DOCX файлы
-    docx_files = glob.glob('*.docx')
-    documents.extend([(f, 'docx') for f in docx_files])
+    # Ищем архивы ZIP/TAR с документами
+    for ext in ARCHIVE_EXTENSIONS:
+        archive_files = glob.glob(f'*{ext}')
+        documents.extend([(f, 'archive') for f in archive_files if (f, 'archive') not in documents])
     
     return documents
 
@@ -238,19 +248,28 @@ def extract_images_menu():
                 file_name_without_ext = os.path.splitext(selected_file)[0]
                 output_folder = os.path.join('done', file_name_without_ext)
                 
+                # Тысячи мелких файлов можно сразу писать в один контейнер на документ
+                pack = input("\nУпаковать изображения в один файл .pack? (y/n): ").strip().lower() in ('y', 'д')
+                
                 print(f"\nИзвлечение изображений из {selected_file}...")
                 
-                # Извлекаем изображения в зависимости от типа файла
-                if file_type == 'pdf':
-                    saved_images = extract_images_from_pdf(selected_file, output_folder)
-                    if saved_images:
-                        print(f"Извлечено {len(saved_images)} изображений в папку: {output_folder}")
+                # Извлекаем изображения: архивы обходим целиком,
+                # для документов формат определяется по содержимому файла
+                if file_type == 'archive':
+                    results = extract_images_from_archive(selected_file, 'done', pack)
+                    total = sum(len(images) for images in results.values())
+                    print(f"Обработано документов в архиве: {len(results)}")
+                    print(f"Извлечено {total} изображений в папку: done")
+                else:
+                    if pack:
+                        with PackWriter(output_folder + PACK_EXT) as writer:
+                            saved_images = extract_images(selected_file, writer)
+                        destination = writer.path
                     else:
-                        print("Изображения не найдены в документе")
-                elif file_type in ['doc', 'docx']:
-                    saved_images = extract_images_from_doc(selected_file, output_folder)
+                        saved_images = extract_images(selected_file, output_folder)
+                        destination = output_folder
                     if saved_images:
-                        print(f"Извлечено {len(saved_images)} изображений в папку: {output_folder}")
+                        print(f"Извлечено {len(saved_images)} изображений в: {destination}")
                     else:
                         print("Изображения не найдены в документе")
                 
@@ -304,6 +323,14 @@ def extract_text_menu():
                 
                 if result_file:
                     print(f"Готово! Файл сохранен: {result_file}")
+                    
+                    # Добавляем текст папки в поисковый индекс
+                    conn = open_index()
+                    try:
+                        count = index_folder(conn, selected_folder)
+                    finally:
+                        conn.close()
+                    print(f"В поисковый индекс добавлено изображений: {count}")
                 else:
                     print("Не удалось извлечь текст")
                 
@@ -319,6 +346,32 @@ def extract_text_menu():
             input("Нажмите Enter для продолжения...")
 
 
+def search_menu():
+    """Меню для поиска по распознанному тексту"""
+    while True:
+        clear_screen()
+        print("|Поиск по тексту|")
+        print()
+        print("0 Назад в главное меню")
+        query = input("\nЗапрос ===============> ").strip()
+        
+        if query == '0':
+            return
+        if not query:
+            continue
+        
+        results = search(query)
+        if not results:
+            print("\nНичего не найдено")
+        else:
+            print()
+            for result in results:
+                page = f", стр. {result['page']}" if result['page'] else ''
+                print(f"{result['folder']} / {result['image']}{page}: {result['snippet']}")
+        
+        input("\nНажмите Enter для продолжения...")
+
+
 def main_menu():
     """Главное меню программы"""
     while True:
@@ -327,6 +380,9 @@ def main_menu():
         print()
         print("1   Вытащить из документа изображения")
         print("2  Извлечь из изображений текст")
+        print("3  Поиск по тексту")
+        print("4  Найти похожие изображения (ускоряет OCR)")
+        print("5  Обработать все документы (изображения + текст)")
         print("0  Выход")
         print()
         choice = input("===============> ")
@@ -335,6 +391,24 @@ def main_menu():
             extract_images_menu()
         elif choice == '2':
             extract_text_menu()
+        elif choice == '3':
+            search_menu()
+        elif choice == '4':
+            clear_screen()
+            print("|Похожие изображения|")
+            print()
+            find_duplicates('done')
+            input("\nНажмите Enter для продолжения...")
+        elif choice == '5':
+            clear_screen()
+            print("|Обработка всех документов|")
+            print()
+            documents = [filename for filename, _ in get_documents()]
+            if documents:
+                run_pipeline(documents, 'done')
+            else:
+                print("Документы не найдены в текущей директории")
+            input("\nНажмите Enter для продолжения...")
         elif choice == '0':
             print("До свидания!")
             break
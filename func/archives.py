@@ -0,0 +1,178 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from func.formats import sniff_header, sniff_format, extract_images, EXTRACTORS, HEADER_SIZE
+from func.pack import PackWriter, PACK_EXT
+
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Члены архива до этого размера держим в памяти, большие - во временном файле
+SPOOL_MAX_MEMORY = 64 * 1024 * 1024
+
+# Максимальная глубина вложенных архивов
+MAX_NESTING = 8
+
+
+def is_archive(filename):
+    """Проверяет по имени файла, является ли он архивом ZIP/TAR"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_stem(filename):
+    """Возвращает имя архива без расширения (в том числе двойного, например .tar.gz)"""
+    name = os.path.basename(filename)
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return os.path.splitext(name)[0]
+
+
+def _spool(stream, size, header=b''):
+    """
+    Копирует член архива в файловый объект с произвольным доступом
+
+    Небольшие члены читаются в io.BytesIO, большие копируются потоком
+    в анонимный временный файл, который удаляется при закрытии.
+    header - уже прочитанное начало потока.
+    """
+    if size is not None and size <= SPOOL_MAX_MEMORY:
+        return io.BytesIO(header + stream.read())
+
+    spooled = tempfile.TemporaryFile()
+    spooled.write(header)
+    shutil.copyfileobj(stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_archive(source, prefix='', depth=0):
+    """
+    Перебирает документы внутри ZIP/TAR архива, включая вложенные архивы
+
+    Архив читается потоком, члены на диск не распаковываются.
+
+    Args:
+        source: путь к архиву или файловый объект
+        prefix: путь архива внутри родительского архива (для вложенных)
+        depth: текущая глубина вложенности
+
+    Yields:
+        тройки (путь члена внутри архива, файловый объект, формат);
+        файловый объект закрывается после перехода к следующему члену
+    """
+    if depth > MAX_NESTING:
+        print(f"Слишком глубокая вложенность архивов: {prefix}")
+        return
+
+    if zipfile.is_zipfile(source):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                yield from _iter_member(info.filename, info.file_size,
+                                        lambda info=info: archive.open(info), prefix, depth)
+        return
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    if isinstance(source, (str, os.PathLike)):
+        archive = tarfile.open(source, mode='r|*')
+    else:
+        archive = tarfile.open(fileobj=source, mode='r|*')
+    with archive:
+        # Режим 'r|*' читает TAR (и сжатый TAR) строго последовательно
+        for info in archive:
+            if not info.isfile():
+                continue
+            yield from _iter_member(info.name, info.size,
+                                    lambda info=info: archive.extractfile(info), prefix, depth)
+
+
+def _iter_member(name, size, open_member, prefix, depth):
+    """
+    Отдает документ или рекурсивно обходит вложенный архив
+
+    Формат определяется по первым байтам члена, поэтому остальные файлы
+    (тексты, изображения) пропускаются без копирования в память.
+    """
+    member_path = f"{prefix}/{name}" if prefix else name
+
+    with open_member() as stream:
+        header = stream.read(HEADER_SIZE)
+        if sniff_header(header) is None:
+            return
+
+        with _spool(stream, size, header) as member:
+            file_format = sniff_format(member)
+            if file_format in ('zip', 'tar'):
+                try:
+                    yield from iter_archive(member, member_path, depth + 1)
+                except (zipfile.BadZipFile, tarfile.TarError) as e:
+                    print(f"Ошибка при чтении вложенного архива {member_path}: {e}")
+            elif file_format in EXTRACTORS:
+                member.seek(0)
+                yield member_path, member, file_format
+
+
+def _member_folder_name(archive_path, member_path):
+    """
+    Имя папки результатов для документа из архива:
+    bundle.zip + nested/inner.tar.gz/docs/a.pdf -> bundle_nested_inner_docs_a
+    """
+    parts = [archive_stem(archive_path)]
+    components = member_path.replace('\\', '/').split('/')
+    for component in components[:-1]:
+        parts.append(archive_stem(component) if is_archive(component) else component)
+    parts.append(os.path.splitext(components[-1])[0])
+    return '_'.join(part for part in parts if part)
+
+
+def extract_images_from_archive(archive_path, output_root='done', pack=False):
+    """
+    Извлекает изображения из всех документов в архиве ZIP/TAR
+
+    Формат каждого документа определяется по содержимому, документ
+    передается нужному экстрактору как файловый объект, изображения
+    сохраняются в папку <output_root>/<архив>_<документ>.
+
+    Args:
+        archive_path: путь к архиву
+        output_root: корневая папка для результатов
+        pack: писать изображения каждого документа прямо в контейнер
+              <output_root>/<архив>_<документ>.pack, без папки
+
+    Returns:
+        словарь {путь документа внутри архива: список путей к сохраненным изображениям}
+    """
+    results = {}
+    used_folders = set()
+
+    try:
+        for member_path, member, file_format in iter_archive(archive_path):
+            output_folder = os.path.join(output_root, _member_folder_name(archive_path, member_path))
+            if output_folder in used_folders:
+                # Документы с одинаковым именем, но разным расширением (a.pdf и a.docx)
+                output_folder += '_' + os.path.splitext(member_path)[1].lstrip('.').lower()
+            used_folders.add(output_folder)
+
+            print(f"Извлечение изображений из {member_path}...")
+            try:
+                if pack:
+                    with PackWriter(output_folder + PACK_EXT) as writer:
+                        results[member_path] = extract_images(member, writer, file_format)
+                else:
+                    results[member_path] = extract_images(member, output_folder, file_format)
+            except Exception as e:
+                print(f"Ошибка при обработке {member_path}: {e}")
+                results[member_path] = []
+    except Exception as e:
+        print(f"Ошибка при чтении архива {archive_path}: {e}")
+
+    return results
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from func.tasks import plan_tasks, create_folders, extract_task, ExtractResult
+from func.pack import pack_folder, is_pack
+
+
+# Результат извлечения одного документа:
+#   path     - путь к документу
+#   size     - размер документа в байтах
+#   format   - формат, определенный по содержимому
+#   folders  - папки (или контейнеры .pack) с результатами
+#   images   - пути к извлеченным изображениям
+#   seconds  - время от начала до конца обработки документа
+#   messages - сообщения экстракторов (предупреждения и ошибки отдельных изображений)
+#   error    - текст ошибки, если документ обработать не удалось, иначе None
+DocumentResult = namedtuple('DocumentResult', 'path size format folders images seconds messages error')
+
+
+def _default_open_files():
+    """Половина мягкого ограничения на число открытых файлов процесса"""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            return max(8, soft // 2)
+    except (ImportError, ValueError, OSError):
+        pass
+    return 256
+
+
+def _default_memory():
+    """Четверть физической памяти или 1 ГБ, если ее размер неизвестен"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 4
+    except (AttributeError, ValueError, OSError):
+        return 1024 * 1024 * 1024
+
+
+def extract_many(paths, out_root='done', workers=None, max_open_files=None, memory_budget=None,
+                 pack=False):
+    """
+    Извлекает изображения из многих документов одним вызовом
+
+    Документы обрабатываются в пуле процессов. Новая задача запускается,
+    только если вместе с уже работающими она укладывается в общий
+    бюджет открытых файлов и памяти (память оценивается грубо: по размеру
+    документа, для архивов - не больше SPOOL_MAX_MEMORY). Одна задача
+    запускается всегда, даже если она одна больше бюджета. Задачи
+    планируются так же, как в run_pipeline (func.tasks.plan_tasks):
+    формат по содержимому, большие PDF делятся на части по страницам.
+    Папки результатов создаются заранее, один раз для всех документов
+    (func.tasks.create_folders); задачи их уже не создают. Документы
+    с одинаковым именем получают разные папки.
+
+    Args:
+        paths: пути к документам и архивам
+        out_root: корневая папка для результатов
+        workers: количество процессов (по умолчанию число ядер)
+        max_open_files: сколько файлов могут быть открыты одновременно
+                        (по умолчанию половина ограничения процесса)
+        memory_budget: оценка памяти всех работающих задач в байтах
+                       (по умолчанию четверть физической памяти)
+        pack: писать результат каждого документа прямо в контейнер .pack
+              (части больших PDF упаковываются после извлечения)
+
+    Returns:
+        словарь со сводкой: results (список DocumentResult в порядке paths),
+        documents, succeeded, failed, images, bytes, seconds,
+        documents_per_second, images_per_second, mb_per_second,
+        workers, max_open_files, memory_budget
+    """
+    workers = workers or os.cpu_count() or 1
+    max_open_files = max_open_files or _default_open_files()
+    memory_budget = memory_budget or _default_memory()
+    start_time = time.perf_counter()
+
+    paths = list(paths)
+    sizes = [0] * len(paths)
+    started = [None] * len(paths)
+    finished = [None] * len(paths)
+    formats = [None] * len(paths)
+    folders = [dict() for _ in paths]
+    messages = [[] for _ in paths]
+    remaining = [0] * len(paths)
+
+    plan_errors = {}
+    tasks = plan_tasks(paths, out_root, plan_errors)
+    errors = [plan_errors.get(index) for index in range(len(paths))]
+    for task in tasks:
+        sizes[task.document] += task.size
+        formats[task.document] = task.format
+        remaining[task.document] += 1
+
+    create_folders(tasks, out_root, pack)
+
+    open_files = 0
+    memory = 0
+    running = {}
+    next_task = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while next_task < len(tasks) or running:
+            # Запускаем задачи, пока они укладываются в бюджет
+            while next_task < len(tasks) and len(running) < workers:
+                task = tasks[next_task]
+                if running and (open_files + task.files > max_open_files
+                                or memory + task.memory > memory_budget):
+                    break
+                open_files += task.files
+                memory += task.memory
+                if started[task.document] is None:
+                    started[task.document] = time.perf_counter()
+                running[pool.submit(extract_task, task, out_root, pack)] = task
+                next_task += 1
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                index = task.document
+                open_files -= task.files
+                memory -= task.memory
+                remaining[index] -= 1
+
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = ExtractResult(task.format, [], [], f"{type(e).__name__}: {e}")
+                messages[index].extend(result.messages)
+                errors[index] = errors[index] or result.error
+                for folder, images in result.folders:
+                    folders[index].setdefault(folder, []).extend(images)
+
+                if remaining[index] == 0:
+                    finished[index] = time.perf_counter()
+                    if pack and errors[index] is None:
+                        folders[index] = _pack_folders(folders[index], messages[index])
+
+    results = []
+    for index, path in enumerate(paths):
+        images = [image for folder_images in folders[index].values() for image in folder_images]
+        seconds = finished[index] - started[index] if started[index] is not None else 0.0
+        results.append(DocumentResult(path, sizes[index], formats[index], list(folders[index]),
+                                      images, seconds, messages[index], errors[index]))
+
+    return summarize(results, time.perf_counter() - start_time, workers=workers,
+                     max_open_files=max_open_files, memory_budget=memory_budget)
+
+
+def _pack_folders(folders, messages):
+    """Упаковывает папки документа; возвращает {контейнер: пути изображений в нем}"""
+    packed = {}
+    for folder, images in folders.items():
+        if is_pack(folder):
+            packed[folder] = images
+            continue
+        if not os.path.isdir(folder):
+            continue
+        try:
+            pack_path = pack_folder(folder)
+        except OSError as e:
+            messages.append(f"Ошибка при упаковке {folder}: {e}")
+            packed[folder] = images
+            continue
+        packed[pack_path] = [os.path.join(pack_path, os.path.basename(image)) for image in images]
+    return packed
+
+
+def summarize(results, seconds, **extra):
+    """
+    Сводка по результатам extract_many для отчета о производительности
+
+    Args:
+        results: список DocumentResult
+        seconds: общее время
+        extra: дополнительные поля сводки (параметры запуска)
+
+    Returns:
+        словарь со сводкой
+    """
+    failed = sum(1 for result in results if result.error)
+    images = sum(len(result.images) for result in results)
+    total_bytes = sum(result.size for result in results)
+    summary = {
+        'results': results,
+        'documents': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'images': images,
+        'bytes': total_bytes,
+        'seconds': seconds,
+        'documents_per_second': len(results) / seconds if seconds else None,
+        'images_per_second': images / seconds if seconds else None,
+        'mb_per_second': total_bytes / (1024 * 1024) / seconds if seconds else None,
+    }
+    summary.update(extra)
+    return summary
+
+
+def summary_to_json(summary):
+    """Сводка в JSON: результаты документов - словари без списков путей к изображениям"""
+    report = dict(summary)
+    report['results'] = [
+        dict(result._asdict(), images=len(result.images)) for result in summary['results']
+    ]
+    return json.dumps(report, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Извлечение изображений из многих документов')
+    parser.add_argument('paths', nargs='+', help='документы и архивы')
+    parser.add_argument('--output', default='done', help='папка для результатов')
+    parser.add_argument('--workers', type=int, help='количество процессов')
+    parser.add_argument('--max-open-files', type=int, help='бюджет открытых файлов')
+    parser.add_argument('--memory-mb', type=int, help='бюджет памяти, МБ')
+    parser.add_argument('--pack', action='store_true', help='упаковать результаты в контейнеры .pack')
+    parser.add_argument('--json', help='сохранить сводку в JSON файл')
+    args = parser.parse_args(argv)
+
+    summary = extract_many(args.paths, args.output, args.workers, args.max_open_files,
+                           args.memory_mb * 1024 * 1024 if args.memory_mb else None, args.pack)
+
+    for result in summary['results']:
+        status = f"ошибка: {result.error}" if result.error else f"{len(result.images)} изображений"
+        print(f"{result.path}: {status}, {result.seconds:.2f} с")
+    print(f"Документов: {summary['documents']} (ошибок: {summary['failed']}), "
+          f"изображений: {summary['images']}, время: {summary['seconds']:.1f} с")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(summary_to_json(summary))
+
+
+if __name__ == '__main__':
+    main()
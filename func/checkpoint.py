@@ -0,0 +1,83 @@
+import os
+import json
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_open(path, mode='wb', encoding=None):
+    """
+    Открывает файл для записи так, чтобы он появился целиком или не появился вовсе
+
+    Данные пишутся во временный файл рядом с целевым, после успешной
+    записи он сбрасывается на диск и заменяет целевой файл через os.replace.
+    При ошибке временный файл удаляется, а старый файл остается без изменений.
+
+    Args:
+        path: путь к итоговому файлу
+        mode: 'wb' или 'w'
+        encoding: кодировка для текстового режима
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Journal:
+    """
+    Журнал результатов, в который записи только дописываются (JSON Lines)
+
+    Каждая запись сбрасывается на диск сразу, поэтому после падения
+    процесса в журнале остаются все завершенные шаги. Недописанная
+    последняя строка при открытии отбрасывается.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                content = f.read()
+            complete = content[:content.rfind(b'\n') + 1]
+            for line in complete.splitlines():
+                try:
+                    self.records.append(json.loads(line))
+                except ValueError:
+                    continue
+            if len(complete) != len(content):
+                # Процесс упал посреди записи - обрезаем хвост
+                with open(path, 'r+b') as f:
+                    f.truncate(len(complete))
+
+        self._file = open(path, 'ab')
+
+    def append(self, record):
+        """Дописывает запись и сбрасывает ее на диск"""
+        self._file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records.append(record)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def remove(self):
+        """Закрывает и удаляет журнал после успешного завершения работы"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import socket
+import argparse
+import http.client
+
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+
+
+# Unix сокеты есть не везде (в Windows их нет)
+UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+if UNIX_SOCKETS:
+    class _UnixHTTPConnection(http.client.HTTPConnection):
+        """HTTPConnection через Unix сокет"""
+
+        def __init__(self, socket_path, timeout=None):
+            super().__init__('localhost', timeout=timeout)
+            self.socket_path = socket_path
+
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if self.timeout is not None:
+                self.sock.settimeout(self.timeout)
+            self.sock.connect(self.socket_path)
+
+
+class ServiceClient:
+    """
+    Клиент службы func.service
+
+    Args:
+        url: адрес службы, например http://127.0.0.1:8765
+        socket_path: путь к Unix сокету (вместо url); там, где Unix сокетов
+                     нет (Windows), вызывает RuntimeError
+        timeout: таймаут сетевых операций, секунды
+    """
+
+    def __init__(self, url=DEFAULT_URL, socket_path=None, timeout=None):
+        if socket_path and not UNIX_SOCKETS:
+            raise RuntimeError("Unix сокеты не поддерживаются на этой платформе, используйте url")
+        self.url = url
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connect(self):
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, self.timeout)
+        host = self.url.split('://', 1)[-1].rstrip('/')
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def _request(self, method, path, data=None):
+        connection = self._connect()
+        try:
+            body = json.dumps(data).encode('utf-8') if data is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            result = json.loads(response.read() or b'{}')
+            if response.status >= 400:
+                raise RuntimeError(result.get('error', f"HTTP {response.status}"))
+            return result
+        finally:
+            connection.close()
+
+    def submit(self, path, output_root=None, lang=None, pack=False):
+        """
+        Отправляет документ в очередь службы
+
+        Путь передается службе как есть, поэтому файл должен быть
+        доступен ей по этому пути (служба работает на той же машине).
+        output_root - подпапка корневой папки службы.
+
+        Returns:
+            словарь с id задания и глубиной очереди
+        """
+        request = {'path': os.path.abspath(path)}
+        if output_root:
+            request['output_root'] = output_root
+        if lang:
+            request['lang'] = lang
+        if pack:
+            request['pack'] = True
+        return self._request('POST', '/jobs', request)
+
+    def status(self, job_id):
+        """Состояние задания"""
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def queue_depth(self):
+        """Глубина очереди службы"""
+        return self._request('GET', '/queue')
+
+    def events(self, job_id):
+        """
+        Читает события задания по мере их появления
+
+        Yields:
+            словари событий; последнее - 'done' или 'error'
+        """
+        connection = self._connect()
+        try:
+            connection.request('GET', f'/jobs/{job_id}/events')
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(json.loads(response.read() or b'{}').get('error', f"HTTP {response.status}"))
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Клиент службы извлечения изображений и OCR')
+    parser.add_argument('--url', default=DEFAULT_URL, help='адрес службы')
+    parser.add_argument('--socket', help='путь к Unix сокету службы')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = subparsers.add_parser('submit', help='отправить документы')
+    submit_parser.add_argument('paths', nargs='+')
+    submit_parser.add_argument('--output', help='подпапка для результатов внутри папки службы')
+    submit_parser.add_argument('--lang', help='языки Tesseract, например rus+eng')
+    submit_parser.add_argument('--pack', action='store_true', help='упаковать результат в контейнер .pack')
+    submit_parser.add_argument('--wait', action='store_true', help='ждать результатов и выводить текст')
+
+    status_parser = subparsers.add_parser('status', help='состояние задания')
+    status_parser.add_argument('job_id')
+
+    subparsers.add_parser('queue', help='глубина очереди')
+
+    args = parser.parse_args(argv)
+    if args.socket and not UNIX_SOCKETS:
+        parser.error("Unix сокеты не поддерживаются на этой платформе, используйте --url")
+    client = ServiceClient(args.url, args.socket)
+
+    if args.command == 'queue':
+        print(json.dumps(client.queue_depth(), ensure_ascii=False))
+    elif args.command == 'status':
+        print(json.dumps(client.status(args.job_id), ensure_ascii=False))
+    else:
+        failed = False
+        job_ids = [client.submit(path, args.output, args.lang, args.pack)['id'] for path in args.paths]
+        for path, job_id in zip(args.paths, job_ids):
+            print(f"{path}: задание {job_id}")
+        if args.wait:
+            for job_id in job_ids:
+                for event in client.events(job_id):
+                    if event['event'] == 'image':
+                        print(f"--- {event['folder']}/{event['image']} ---")
+                        print(event['text'])
+                    elif event['event'] == 'text':
+                        print(f"Текст сохранен в: {event['text_file']}")
+                    elif event['event'] in ('error', 'image_error'):
+                        failed = True
+                        print(f"Ошибка: {event['message']}", file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
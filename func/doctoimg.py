@@ -1,126 +1,170 @@
 import os
+import re
+import shutil
 import zipfile
 
+from func.mmapio import open_source, detect_image_ext, zip_member_offset, OLE_SIGNATURE
+from func.pack import output_writer
 
-def extract_images_from_docx(docx_path, output_folder):
+
+# Разбор изображений в RTF
+_RTF_PICT = re.compile(rb'\{\\pict')
+_RTF_CONTROL = re.compile(rb'\\([a-z]+)(-?\d+)? ?')
+_RTF_HEX = re.compile(rb'[0-9a-fA-F\s]+')
+_RTF_BLIP_TYPES = {b'pngblip': '.png', b'jpegblip': '.jpg'}
+
+
+def _unique_name(output, filename):
+    """Возвращает имя для сохранения файла; если файл уже существует, добавляет счетчик"""
+    image_name = filename
+    
+    if output.exists(image_name):
+        name, ext = os.path.splitext(filename)
+        counter = 1
+        while output.exists(image_name):
+            image_name = f"{name}_{counter}{ext}"
+            counter += 1
+    
+    return image_name
+
+
+def extract_images_from_zip_media(zip_path, output_folder, media_prefixes):
     """
-    Извлекает изображения из DOCX файла (DOCX - это ZIP архив)
+    Извлекает изображения из документа-ZIP архива (DOCX, XLSX, PPTX, ODT и т.д.)
+    
+    Несжатые изображения (обычно JPEG) копируются из файла напрямую
+    через copy_range, смещение данных берется из отображенного в память
+    файла. Сжатые изображения распаковываются потоком без чтения
+    целиком в память.
     
     Args:
-        docx_path: путь к DOCX файлу
-        output_folder: папка для сохранения изображений
+        zip_path: путь к документу или открытый двоичный файл
+        output_folder: папка для сохранения изображений или writer
+                       (func.pack.PackWriter - запись прямо в контейнер)
+        media_prefixes: папки внутри архива, в которых хранятся изображения
     
     Returns:
         список путей к сохраненным изображениям
     """
     saved_images = []
+    output = output_writer(output_folder)
     
     try:
-        # DOCX файлы - это ZIP архивы
-        with zipfile.ZipFile(docx_path, 'r') as zip_ref:
-            # Извлекаем все файлы из папки word/media/ (там хранятся изображения)
-            image_files = [f for f in zip_ref.namelist() if f.startswith('word/media/')]
+        with open_source(zip_path) as source, zipfile.ZipFile(source.file, 'r') as zip_ref:
+            # Извлекаем все файлы из папок с изображениями
+            image_files = [info for info in zip_ref.infolist()
+                           if info.filename.startswith(media_prefixes) and not info.is_dir()]
             
-            for image_file in image_files:
+            for info in image_files:
                 try:
-                    # Извлекаем файл
-                    file_data = zip_ref.read(image_file)
+                    # Сохраняем изображение под его именем из архива
+                    image_name = _unique_name(output, os.path.basename(info.filename))
                     
-                    # Получаем имя файла
-                    filename = os.path.basename(image_file)
-                    
-                    # Сохраняем изображение
-                    image_path = os.path.join(output_folder, filename)
-                    
-                    # Если файл уже существует, добавляем префикс
-                    if os.path.exists(image_path):
-                        name, ext = os.path.splitext(filename)
-                        counter = 1
-                        while os.path.exists(image_path):
-                            image_path = os.path.join(output_folder, f"{name}_{counter}{ext}")
-                            counter += 1
-                    
-                    with open(image_path, 'wb') as f:
-                        f.write(file_data)
+                    if info.compress_type == zipfile.ZIP_STORED:
+                        output.write_range(source, zip_member_offset(source.data, info), info.file_size, image_name)
+                    else:
+                        with zip_ref.open(info) as src, output.open(image_name) as f:
+                            shutil.copyfileobj(src, f)
                     
-                    saved_images.append(image_path)
+                    saved_images.append(output.join(image_name))
                     
                 except Exception as e:
-                    print(f"Ошибка при извлечении {image_file}: {e}")
+                    print(f"Ошибка при извлечении {info.filename}: {e}")
                     continue
                     
     except Exception as e:
-        print(f"Ошибка при открытии DOCX файла: {e}")
+        print(f"Ошибка при открытии файла {getattr(zip_path, 'name', zip_path)}: {e}")
     
     return saved_images
 
 
+def extract_images_from_docx(docx_path, output_folder):
+    """
+    Извлекает изображения из DOCX файла (DOCX - это ZIP архив)
+    
+    Args:
+        docx_path: путь к DOCX файлу или открытый двоичный файл
+        output_folder: папка для сохранения изображений
+    
+    Returns:
+        список путей к сохраненным изображениям
+    """
+    # Изображения хранятся в папке word/media/
+    return extract_images_from_zip_media(docx_path, output_folder, ('word/media/',))
+
+
+def extract_images_from_xlsx(xlsx_path, output_folder):
+    """Извлекает изображения из XLSX файла (папка xl/media/)"""
+    return extract_images_from_zip_media(xlsx_path, output_folder, ('xl/media/',))
+
+
+def extract_images_from_pptx(pptx_path, output_folder):
+    """Извлекает изображения из PPTX файла (папка ppt/media/)"""
+    return extract_images_from_zip_media(pptx_path, output_folder, ('ppt/media/',))
+
+
+def extract_images_from_odf(odf_path, output_folder):
+    """Извлекает изображения из документов OpenDocument: ODT, ODS, ODP (папка Pictures/)"""
+    return extract_images_from_zip_media(odf_path, output_folder, ('Pictures/',))
+
+
 def extract_images_from_doc_old(doc_path, output_folder):
     """
     Извлекает изображения из DOC файла (старый формат OLE2)
     
+    Файл отображается в память, сигнатуры потоков проверяются
+    и записываются через memoryview без лишнего копирования.
+    
     Args:
-        doc_path: путь к DOC файлу
+        doc_path: путь к DOC файлу или открытый двоичный файл
         output_folder: папка для сохранения изображений
     
     Returns:
         список путей к сохраненным изображениям
     """
     saved_images = []
+    output = output_writer(output_folder)
     
     try:
         # DOC файлы - это OLE2 файлы (более сложный формат)
         # Используем библиотеку olefile для работы с DOC
         import olefile
         
-        if not olefile.isOleFile(doc_path):
-            print("Файл не является корректным DOC файлом")
-            return []
-        
-        with olefile.OleFileIO(doc_path) as ole:
-            # В DOC файлах изображения хранятся в разных местах
-            # Пробуем найти изображения в потоках
-            
-            stream_names = ole.listdir()
+        with open_source(doc_path) as source:
+            if source.data[:len(OLE_SIGNATURE)] != OLE_SIGNATURE:
+                print("Файл не является корректным DOC файлом")
+                return []
             
-            # Пробуем найти все потоки и искать в них изображения по сигнатурам
-            for stream_name in stream_names:
-                try:
-                    stream_path = '/'.join(stream_name) if isinstance(stream_name, tuple) else stream_name
-                    stream_data = ole.openstream(stream_path).read()
-                    
-                    # Проверяем сигнатуры изображений
-                    if stream_data.startswith(b'\xff\xd8\xff'):  # JPEG
-                        ext = '.jpg'
-                    elif stream_data.startswith(b'\x89PNG\r\n\x1a\n'):  # PNG
-                        ext = '.png'
-                    elif stream_data.startswith(b'GIF87a') or stream_data.startswith(b'GIF89a'):  # GIF
-                        ext = '.gif'
-                    elif stream_data.startswith(b'BM'):  # BMP
-                        ext = '.bmp'
-                    else:
+            with olefile.OleFileIO(source.stream) as ole:
+                # В DOC файлах изображения хранятся в разных местах
+                # Пробуем найти изображения в потоках
+                
+                stream_names = ole.listdir()
+                
+                # Пробуем найти все потоки и искать в них изображения по сигнатурам
+                for stream_name in stream_names:
+                    try:
+                        stream_path = '/'.join(stream_name) if isinstance(stream_name, tuple) else stream_name
+                        stream = ole.openstream(stream_path)
+                        
+                        with stream.getbuffer() as stream_data:
+                            # Проверяем сигнатуры изображений
+                            ext = detect_image_ext(stream_data)
+                            if ext is None:
+                                continue
+                            
+                            # Сохраняем изображение
+                            filename = f"image_{stream_path.replace('/', '_')}{ext}"
+                            image_name = _unique_name(output, filename)
+                            
+                            with output.open(image_name) as f:
+                                f.write(stream_data)
+                        
+                        saved_images.append(output.join(image_name))
+                        
+                    except Exception:
                         continue
                     
-                    # Сохраняем изображение
-                    filename = f"image_{stream_path.replace('/', '_')}{ext}"
-                    image_path = os.path.join(output_folder, filename)
-                    
-                    # Если файл уже существует, добавляем префикс
-                    if os.path.exists(image_path):
-                        name, ext = os.path.splitext(filename)
-                        counter = 1
-                        while os.path.exists(image_path):
-                            image_path = os.path.join(output_folder, f"{name}_{counter}{ext}")
-                            counter += 1
-                    
-                    with open(image_path, 'wb') as f:
-                        f.write(stream_data)
-                    
-                    saved_images.append(image_path)
-                    
-                except Exception:
-                    continue
-                    
     except ImportError:
         print("Для работы с DOC файлами необходима библиотека olefile")
         print("Установите: pip install olefile")
@@ -131,10 +175,103 @@ def extract_images_from_doc_old(doc_path, output_folder):
     return saved_images
 
 
+def extract_images_from_rtf(rtf_path, output_folder):
+    """
+    Извлекает изображения из RTF файла
+    
+    Изображения хранятся в группах {\\pict ...} в шестнадцатеричном виде
+    (или в двоичном после \\bin). Сохраняются PNG и JPEG, метафайлы
+    WMF/EMF пропускаются - их нельзя распознать OCR.
+    
+    Args:
+        rtf_path: путь к RTF файлу или открытый двоичный файл
+        output_folder: папка для сохранения изображений
+    
+    Returns:
+        список путей к сохраненным изображениям
+    """
+    saved_images = []
+    output = output_writer(output_folder)
+    
+    try:
+        with open_source(rtf_path) as source:
+            data = source.data
+            for number, match in enumerate(_RTF_PICT.finditer(data), 1):
+                try:
+                    ext, picture = _read_rtf_picture(data, match.end())
+                    if ext is None or not picture:
+                        continue
+                    
+                    image_name = _unique_name(output, f"image_{number}{ext}")
+                    with output.open(image_name) as f:
+                        f.write(picture)
+                    
+                    saved_images.append(output.join(image_name))
+                    
+                except Exception as e:
+                    print(f"Ошибка при извлечении изображения {number}: {e}")
+                    continue
+                    
+    except Exception as e:
+        print(f"Ошибка при извлечении изображений из RTF файла: {e}")
+    
+    return saved_images
+
+
+def _read_rtf_picture(data, pos):
+    """
+    Читает содержимое группы \\pict, начиная с позиции после "{\\pict"
+    
+    Returns:
+        (расширение или None, данные изображения)
+    """
+    depth = 1
+    ext = None
+    chunks = []
+    
+    while pos < len(data) and depth:
+        ch = data[pos:pos + 1]
+        if ch == b'{':
+            depth += 1
+            pos += 1
+        elif ch == b'}':
+            depth -= 1
+            pos += 1
+        elif ch == b'\\':
+            control = _RTF_CONTROL.match(data, pos)
+            if not control:
+                pos += 2
+                continue
+            pos = control.end()
+            word = control.group(1)
+            if depth == 1 and word in _RTF_BLIP_TYPES:
+                ext = _RTF_BLIP_TYPES[word]
+            elif word == b'bin' and control.group(2):
+                # Двоичные данные заданной длины сразу после \\binN
+                length = int(control.group(2))
+                if depth == 1:
+                    chunks.append(bytes(data[pos:pos + length]))
+                pos += length
+        else:
+            hex_run = _RTF_HEX.match(data, pos)
+            if hex_run:
+                if depth == 1:
+                    chunks.append(bytes.fromhex(hex_run.group().decode('ascii')))
+                pos = hex_run.end()
+            else:
+                pos += 1
+    
+    return ext, b''.join(chunks)
+
+
 def extract_images_from_doc(doc_path, output_folder):
     """
     Извлекает изображения из DOC/DOCX файла и сохраняет их в указанную папку
     
+    Формат определяется по содержимому файла, а не по расширению
+    (см. func.formats.extract_images), поэтому подходят и другие форматы:
+    PDF, XLSX, PPTX, ODT, RTF.
+    
     Args:
         doc_path: путь к DOC/DOCX файлу
         output_folder: папка для сохранения изображений
@@ -142,17 +279,6 @@ def extract_images_from_doc(doc_path, output_folder):
     Returns:
         список путей к сохраненным изображениям
     """
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
-    # Определяем тип файла по расширению
-    file_ext = os.path.splitext(doc_path)[1].lower()
-    
-    if file_ext == '.docx':
-        return extract_images_from_docx(doc_path, output_folder)
-    elif file_ext == '.doc':
-        return extract_images_from_doc_old(doc_path, output_folder)
-    else:
-        print(f"Неподдерживаемый формат файла: {file_ext}")
-        return []
-
+    from func.formats import extract_images
+    
+    return extract_images(doc_path, output_folder)
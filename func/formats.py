@@ -0,0 +1,177 @@
+import os
+import zipfile
+
+from func.mmapio import open_source, OLE_SIGNATURE
+from func.pack import output_writer
+from func.pdftoimg import extract_images_from_pdf
+from func.doctoimg import (
+    extract_images_from_docx, extract_images_from_xlsx, extract_images_from_pptx,
+    extract_images_from_odf, extract_images_from_doc_old, extract_images_from_rtf,
+)
+
+
+# Сколько байт начала файла нужно для определения формата
+HEADER_SIZE = 1024
+
+# В каком окне от начала файла искать заголовок %PDF-
+PDF_HEADER_WINDOW = 256
+
+# Типы документов OpenDocument по содержимому файла mimetype
+_ODF_MIMETYPES = {
+    b'application/vnd.oasis.opendocument.text': 'odt',
+    b'application/vnd.oasis.opendocument.spreadsheet': 'ods',
+    b'application/vnd.oasis.opendocument.presentation': 'odp',
+}
+
+# Типы документов Office Open XML по папке с содержимым
+_OOXML_FOLDERS = (
+    ('word/', 'docx'),
+    ('xl/', 'xlsx'),
+    ('ppt/', 'pptx'),
+)
+
+# Форматы, которые являются ZIP архивами
+_ZIP_FORMATS = ('docx', 'xlsx', 'pptx', 'odt', 'ods', 'odp')
+
+# Формат по расширению - если по содержимому определить не удалось
+EXTENSION_FORMATS = {
+    '.pdf': 'pdf',
+    '.doc': 'doc',
+    '.docx': 'docx',
+    '.xlsx': 'xlsx',
+    '.pptx': 'pptx',
+    '.odt': 'odt',
+    '.ods': 'ods',
+    '.odp': 'odp',
+    '.rtf': 'rtf',
+}
+
+# Реестр экстракторов: формат -> функция (source, output_folder) -> список путей
+EXTRACTORS = {}
+
+
+def register_extractor(file_format, extractor):
+    """
+    Регистрирует функцию извлечения изображений для формата
+
+    Args:
+        file_format: имя формата, которое возвращает sniff_format
+        extractor: функция (путь или файловый объект, папка) -> список путей к изображениям
+    """
+    EXTRACTORS[file_format] = extractor
+
+
+register_extractor('pdf', extract_images_from_pdf)
+register_extractor('doc', extract_images_from_doc_old)
+register_extractor('docx', extract_images_from_docx)
+register_extractor('xlsx', extract_images_from_xlsx)
+register_extractor('pptx', extract_images_from_pptx)
+register_extractor('odt', extract_images_from_odf)
+register_extractor('ods', extract_images_from_odf)
+register_extractor('odp', extract_images_from_odf)
+register_extractor('rtf', extract_images_from_rtf)
+
+
+def sniff_header(header):
+    """
+    Грубо определяет тип файла по первым байтам
+
+    Args:
+        header: первые HEADER_SIZE байт файла
+
+    Returns:
+        'pdf', 'zip', 'ole', 'rtf', 'tar' или None
+    """
+    if header[:4] == b'PK\x03\x04' or header[:4] == b'PK\x05\x06':
+        return 'zip'
+    if header[:len(OLE_SIGNATURE)] == OLE_SIGNATURE:
+        return 'ole'
+    if header[:5] == b'{\\rtf':
+        return 'rtf'
+    # TAR проверяем до PDF: данные первого члена начинаются с байта 512,
+    # и TAR с PDF внутри иначе был бы принят за PDF
+    if header[257:262] == b'ustar':
+        return 'tar'
+    # Сжатые потоки считаем TAR архивами: tarfile сам выберет алгоритм
+    if header[:2] == b'\x1f\x8b' or header[:3] == b'BZh' or header[:6] == b'\xfd7zXZ\x00':
+        return 'tar'
+    # Заголовок PDF может стоять не в самом начале файла - читатели
+    # допускают небольшой мусор перед ним
+    if bytes(header[:PDF_HEADER_WINDOW]).find(b'%PDF-') != -1:
+        return 'pdf'
+    return None
+
+
+def sniff_format(source):
+    """
+    Определяет формат документа по содержимому
+
+    Для ZIP файлов читается только центральный каталог архива:
+    [Content_Types].xml и папка word/, xl/ или ppt/ для Office Open XML,
+    файл mimetype для OpenDocument.
+
+    Args:
+        source: путь к файлу или двоичный файловый объект
+
+    Returns:
+        'pdf', 'doc', 'docx', 'xlsx', 'pptx', 'odt', 'ods', 'odp', 'rtf',
+        'zip' или 'tar' для архивов, None если формат неизвестен
+    """
+    with open_source(source) as opened:
+        kind = sniff_header(opened.data[:HEADER_SIZE])
+        if kind == 'ole':
+            return 'doc'
+        if kind != 'zip':
+            return kind
+
+        try:
+            with zipfile.ZipFile(opened.file) as archive:
+                names = archive.namelist()
+                if 'mimetype' in names:
+                    mimetype = archive.read('mimetype').strip()
+                    if mimetype in _ODF_MIMETYPES:
+                        return _ODF_MIMETYPES[mimetype]
+                if '[Content_Types].xml' in names:
+                    for folder, file_format in _OOXML_FOLDERS:
+                        if any(name.startswith(folder) for name in names):
+                            return file_format
+        except zipfile.BadZipFile:
+            return None
+        return 'zip'
+
+
+def extract_images(source, output_folder, file_format=None):
+    """
+    Извлекает изображения из документа любого поддерживаемого формата
+
+    Формат определяется по содержимому (sniff_format), поэтому файлы
+    с неправильным расширением обрабатываются нужным экстрактором.
+
+    Args:
+        source: путь к документу или двоичный файловый объект
+        output_folder: папка для сохранения изображений или writer
+                       (func.pack.PackWriter - запись прямо в контейнер)
+        file_format: формат, если он уже известен
+
+    Returns:
+        список путей к сохраненным изображениям
+    """
+    output = output_writer(output_folder)
+
+    name = source if isinstance(source, str) else getattr(source, 'name', '')
+    if file_format is None:
+        file_format = sniff_format(source)
+
+    if file_format not in EXTRACTORS and isinstance(name, str):
+        # Содержимое не распознано (или это ZIP без признаков Office/ODF) -
+        # доверяем расширению, но ZIP не отдаем экстрактору PDF, DOC или RTF
+        ext_format = EXTENSION_FORMATS.get(os.path.splitext(name)[1].lower())
+        if file_format is None or ext_format in _ZIP_FORMATS:
+            file_format = ext_format or file_format
+
+    extractor = EXTRACTORS.get(file_format)
+    if extractor is None:
+        print(f"Неподдерживаемый формат файла: {name or file_format}")
+        return []
+
+    return extractor(source, output)
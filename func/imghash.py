@@ -0,0 +1,282 @@
+import os
+import json
+import glob
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from func.pack import is_pack, document_name, split_pack_path, list_pack, pack_member_info
+from func.tiles import open_bounded
+
+
+DUPLICATES_FILE = 'duplicates.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')
+
+# Размер изображения для pHash и матрица DCT-II для него
+_PHASH_SIZE = 32
+_DCT = np.sqrt(2.0 / _PHASH_SIZE) * np.cos(
+    np.pi * np.outer(np.arange(_PHASH_SIZE), 2 * np.arange(_PHASH_SIZE) + 1) / (2 * _PHASH_SIZE)
+)
+_DCT[0] /= np.sqrt(2.0)
+
+
+def hamming(a, b):
+    """Расстояние Хэмминга между двумя 64-битными хэшами"""
+    return bin(a ^ b).count('1')
+
+
+def _load_gray(image_path):
+    """
+    Открывает изображение и возвращает уменьшенные копии в оттенках серого:
+    32x32 для aHash/pHash и 9x8 для dHash
+    """
+    with open_bounded(image_path) as image:
+        # Для JPEG декодируем сразу в уменьшенном масштабе
+        image.draft('L', (_PHASH_SIZE * 4, _PHASH_SIZE * 4))
+        gray = image.convert('L')
+        square = gray.resize((_PHASH_SIZE, _PHASH_SIZE), Image.LANCZOS)
+        wide = gray.resize((9, 8), Image.LANCZOS)
+    return np.asarray(square, dtype=np.float32), np.asarray(wide, dtype=np.float32)
+
+
+def _pack_bits(bits):
+    """Упаковывает массив (N, 64) из bool в список 64-битных целых"""
+    packed = np.packbits(bits.reshape(len(bits), 64), axis=1)
+    return [int(value) for value in packed.view('>u8').ravel()]
+
+
+def compute_hashes(image_paths):
+    """
+    Вычисляет aHash, dHash и pHash для списка изображений
+
+    Декодирование выполняется по одному изображению, а сами хэши
+    считаются сразу для всего пакета операциями NumPy.
+
+    Args:
+        image_paths: список путей к изображениям
+
+    Returns:
+        список кортежей (ahash, dhash, phash) или None для нечитаемых изображений
+    """
+    squares = []
+    wides = []
+    valid = []
+    for i, image_path in enumerate(image_paths):
+        try:
+            square, wide = _load_gray(image_path)
+        except Exception as e:
+            print(f"Ошибка при чтении {image_path}: {e}")
+            continue
+        squares.append(square)
+        wides.append(wide)
+        valid.append(i)
+
+    result = [None] * len(image_paths)
+    if not valid:
+        return result
+
+    squares = np.stack(squares)
+    wides = np.stack(wides)
+
+    # aHash: среднее по блокам 4x4 сравнивается со средним по изображению
+    blocks = squares.reshape(len(squares), 8, 4, 8, 4).mean(axis=(2, 4))
+    ahash = blocks > blocks.mean(axis=(1, 2), keepdims=True)
+
+    # dHash: каждый пиксель сравнивается с соседом справа
+    dhash = wides[:, :, 1:] > wides[:, :, :-1]
+
+    # pHash: низкие частоты DCT сравниваются с медианой (без постоянной составляющей)
+    coeffs = (_DCT @ squares @ _DCT.T)[:, :8, :8].reshape(len(squares), 64)
+    median = np.median(coeffs[:, 1:], axis=1, keepdims=True)
+    phash = coeffs > median
+
+    for i, a, d, p in zip(valid, _pack_bits(ahash), _pack_bits(dhash), _pack_bits(phash)):
+        result[i] = (a, d, p)
+    return result
+
+
+class BKTree:
+    """BK-дерево для поиска хэшей на расстоянии Хэмминга не больше заданного"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        """Добавляет хэш value с привязанным объектом item"""
+        if self.root is None:
+            self.root = (value, item, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """
+        Ищет все хэши на расстоянии не больше max_distance
+
+        Returns:
+            список пар (расстояние, item), отсортированный по расстоянию
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, item))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+def _list_images(base_folder):
+    """
+    Изображения во всех папках и контейнерах .pack base_folder
+
+    Returns:
+        список пар (ключ, путь): ключ - <документ>/<имя> (для контейнера
+        тоже без .pack, как в extract_text_from_images), путь - файл
+        на диске или член контейнера done/doc.pack/<имя>
+    """
+    images = []
+    for item in sorted(os.listdir(base_folder)):
+        item_path = os.path.join(base_folder, item)
+        if is_pack(item_path):
+            names = sorted(list_pack(item_path))
+        elif os.path.isdir(item_path):
+            names = [os.path.basename(path) for path in sorted(glob.glob(os.path.join(item_path, '*')))]
+        else:
+            continue
+        for name in names:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                images.append((f'{document_name(item_path)}/{name}', os.path.join(item_path, name)))
+    return images
+
+
+def _image_stamp(image_path):
+    """
+    Признаки, по которым видно, что изображение изменилось:
+    (mtime, размер) файла или (CRC32, размер) члена контейнера
+    """
+    pack_path, name = split_pack_path(image_path)
+    if pack_path is None:
+        stat = os.stat(image_path)
+        return stat.st_mtime, stat.st_size
+    info = pack_member_info(pack_path, name)
+    return info.CRC, info.file_size
+
+
+def find_duplicates(base_folder='done', max_distance=6, batch_size=256):
+    """
+    Находит почти одинаковые изображения во всех папках base_folder
+
+    Изображения считаются дубликатами, если и pHash, и dHash отличаются
+    не больше чем на max_distance бит. Изображения контейнеров .pack
+    читаются прямо из них. Хэши кэшируются в duplicates.json и
+    пересчитываются только для новых или измененных файлов.
+
+    Args:
+        base_folder: папка с извлеченными изображениями
+        max_distance: максимальное расстояние Хэмминга
+        batch_size: количество изображений в одном пакете вычисления хэшей
+
+    Returns:
+        список групп дубликатов (списки путей относительно base_folder)
+    """
+    if not os.path.exists(base_folder):
+        return []
+
+    duplicates_path = os.path.join(base_folder, DUPLICATES_FILE)
+    cached = {}
+    if os.path.exists(duplicates_path):
+        with open(duplicates_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f).get('hashes', {})
+
+    images = _list_images(base_folder)
+    hashes = {}
+    pending = []
+    for rel_path, image_path in images:
+        stamp = list(_image_stamp(image_path))
+        entry = cached.get(rel_path)
+        if entry and entry[:2] == stamp:
+            hashes[rel_path] = entry
+        else:
+            pending.append((rel_path, image_path, stamp))
+
+    print(f"Вычисление хэшей: {len(pending)} новых из {len(images)} изображений...")
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        paths = [image_path for _, image_path, _ in batch]
+        for (rel_path, _, stamp), values in zip(batch, compute_hashes(paths)):
+            if values is not None:
+                hashes[rel_path] = stamp + [f'{v:016x}' for v in values]
+
+    # Группируем: первое изображение группы попадает в дерево, остальные к нему присоединяются
+    tree = BKTree()
+    groups = []
+    for rel_path, _ in images:
+        if rel_path not in hashes:
+            continue
+        dhash = int(hashes[rel_path][3], 16)
+        phash = int(hashes[rel_path][4], 16)
+        for _, (group_index, group_dhash) in tree.search(phash, max_distance):
+            if hamming(dhash, group_dhash) <= max_distance:
+                groups[group_index].append(rel_path)
+                break
+        else:
+            tree.add(phash, (len(groups), dhash))
+            groups.append([rel_path])
+
+    groups = [group for group in groups if len(group) > 1]
+    duplicates = sum(len(group) - 1 for group in groups)
+
+    with open(duplicates_path, 'w', encoding='utf-8') as f:
+        json.dump({'max_distance': max_distance, 'groups': groups, 'hashes': hashes},
+                  f, ensure_ascii=False)
+
+    if images:
+        print(f"Найдено групп похожих изображений: {len(groups)}")
+        print(f"Можно не распознавать повторно: {duplicates} из {len(images)} "
+              f"({duplicates / len(images):.1%} вызовов OCR)")
+    return groups
+
+
+def load_duplicates(base_folder='done'):
+    """
+    Загружает группы дубликатов, найденные find_duplicates
+
+    Args:
+        base_folder: папка с извлеченными изображениями
+
+    Returns:
+        словарь {путь изображения относительно base_folder: группа (список путей)}
+    """
+    duplicates_path = os.path.join(base_folder, DUPLICATES_FILE)
+    if not os.path.exists(duplicates_path):
+        return {}
+
+    with open(duplicates_path, 'r', encoding='utf-8') as f:
+        groups = json.load(f).get('groups', [])
+
+    return {rel_path: group for group in groups for rel_path in group}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Поиск почти одинаковых изображений перед OCR')
+    parser.add_argument('--base', default='done', help='папка с извлеченными изображениями')
+    parser.add_argument('--distance', type=int, default=6,
+                        help='максимальное расстояние Хэмминга между хэшами')
+    args = parser.parse_args(argv)
+    find_duplicates(args.base, args.distance)
+
+
+if __name__ == '__main__':
+    main()
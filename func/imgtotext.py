@@ -1,18 +1,31 @@
+import io
 import os
-from PIL import Image
 import pytesseract
 import glob
 
+from func.ocrdata import (
+    words_from_tesseract, words_to_text, format_image_text, save_ocr_data,
+    load_ocr_data, image_word_list,
+)
+from func.imghash import load_duplicates
+from func.checkpoint import Journal, atomic_open
+from func.pack import is_pack, document_name, sidecar_path, list_pack, update_pack, pack_member_info, PACK_EXT
+from func.tiles import needs_tiling, ocr_tiled, open_bounded, ocr_memory, memory_budget
+from func.ocrlang import DocumentLanguages, DEFAULT_LANG, MIN_CONFIDENCE, mean_confidence
+
 
 def get_image_folders(base_folder='done'):
     """
     Получает список всех папок с изображениями в указанной директории
     
+    Упакованные документы (<документ>.pack, см. func.pack) возвращаются
+    вместе с папками - с ними работают те же функции.
+    
     Args:
         base_folder: базовая папка для поиска
     
     Returns:
-        список путей к папкам
+        список путей к папкам и контейнерам
     """
     if not os.path.exists(base_folder):
         return []
@@ -20,71 +33,302 @@ def get_image_folders(base_folder='done'):
     folders = []
     for item in os.listdir(base_folder):
         item_path = os.path.join(base_folder, item)
-        if os.path.isdir(item_path):
+        if os.path.isdir(item_path) or (item.lower().endswith(PACK_EXT) and os.path.isfile(item_path)):
             folders.append(item_path)
     
     return folders
 
 
-def extract_text_from_images(folder_path):
+def list_images(folder_path):
     """
-    Извлекает текст из всех изображений в папке с помощью OCR
-    Поддерживает русский и английский языки
+    Возвращает отсортированный список изображений в папке
+    
+    Для контейнера .pack возвращаются пути вида done/doc.pack/<имя>,
+    изображения читаются из него на месте (func.pack.open_image).
     
     Args:
-        folder_path: путь к папке с изображениями
+        folder_path: путь к папке с изображениями или к контейнеру
     
     Returns:
-        путь к созданному текстовому файлу
+        список путей к изображениям
     """
     # Поддерживаемые форматы изображений
     image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.gif']
     
+    if is_pack(folder_path):
+        suffixes = tuple(ext[1:] for ext in image_extensions)
+        return sorted(os.path.join(folder_path, name) for name in list_pack(folder_path)
+                      if name.lower().endswith(suffixes))
+    
     # Собираем все изображения из папки
-    image_files = []
+    image_files = set()
     for ext in image_extensions:
-        image_files.extend(glob.glob(os.path.join(folder_path, ext)))
-        image_files.extend(glob.glob(os.path.join(folder_path, ext.upper())))
+        image_files.update(glob.glob(os.path.join(folder_path, ext)))
+        image_files.update(glob.glob(os.path.join(folder_path, ext.upper())))
+    
+    return sorted(image_files)
+
+
+def save_folder_text(folder_path, results):
+    """
+    Сохраняет результаты OCR папки: <имя_папки>.txt и <имя_папки>.npz
+    
+    Файлы записываются атомарно: при падении процесса остается либо
+    прежняя версия файла, либо новая целиком. Для контейнера .pack
+    оба файла добавляются в контейнер.
+    
+    Args:
+        folder_path: путь к папке с изображениями
+        results: список пар (имя изображения, список слов) в порядке изображений
+    
+    Returns:
+        путь к текстовому файлу или None, если текст не был извлечен
+    """
+    all_text = []
+    for image_name, words in results:
+        text = words_to_text(words)
+        if text.strip():
+            all_text.append(format_image_text(image_name, text))
+    
+    if not all_text:
+        return None
+    
+    folder_name = document_name(folder_path)
+    output_file = os.path.join(folder_path, f'{folder_name}.txt')
+    if is_pack(folder_path):
+        data = io.BytesIO()
+        save_ocr_data(data, results)
+        update_pack(folder_path, {
+            f'{folder_name}.txt': ''.join(all_text).encode('utf-8'),
+            f'{folder_name}.npz': data.getvalue(),
+        })
+        return output_file
+    
+    with atomic_open(output_file, 'w', encoding='utf-8') as f:
+        f.write(''.join(all_text))
+    save_ocr_data(os.path.join(folder_path, f'{folder_name}.npz'), results)
+    return output_file
+
+
+def ocr_journal_path(folder_path):
+    """Путь к журналу распознанных изображений папки"""
+    return sidecar_path(folder_path, '.journal')
+
+
+def load_ocr_journal(journal):
+    """
+    Возвращает уже распознанные изображения из журнала
+
+    Args:
+        journal: Journal папки
+
+    Returns:
+        словарь {имя изображения: список слов}
+    """
+    return {record['image']: [tuple(word) for word in record['words']] for record in journal.records}
+
+
+def ocr_image(image_path, lang='rus+eng', memory_limit=None):
+    """
+    Распознает текст изображения с координатами слов
+
+    Очень большие изображения (например, сканы чертежей) распознаются
+    по перекрывающимся частям в нескольких потоках (func.tiles). Память
+    каждого вызова резервируется в общем бюджете func.tiles.memory_budget,
+    поэтому одновременные вызовы из разных потоков вместе его не превышают.
+
+    Args:
+        image_path: путь к изображению
+        lang: языки Tesseract
+        memory_limit: потолок памяти на изображение в байтах
+                      (по умолчанию func.tiles.MEMORY_LIMIT)
+
+    Returns:
+        список слов в формате words_from_tesseract
+    """
+    with open_bounded(image_path, memory_limit) as image:
+        if needs_tiling(image, memory_limit):
+            return ocr_tiled(image, lang, memory_limit)
+        with memory_budget.reserve(ocr_memory(image)):
+            data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    return words_from_tesseract(data)
+
+
+def ocr_image_auto(image_path, languages, memory_limit=None):
+    """
+    Распознает изображение с языками, выбранными для документа
+
+    Если средняя уверенность распознавания ниже MIN_CONFIDENCE,
+    изображение распознается заново с DEFAULT_LANG.
+
+    Args:
+        image_path: путь к изображению
+        languages: DocumentLanguages папки
+        memory_limit: потолок памяти на изображение в байтах
+
+    Returns:
+        список слов в формате words_from_tesseract
+    """
+    lang = languages.choose(image_path)
+    words = ocr_image(image_path, lang=lang, memory_limit=memory_limit)
+    if lang != DEFAULT_LANG:
+        confidence = mean_confidence(words)
+        if confidence is not None and confidence < MIN_CONFIDENCE:
+            languages.reject(image_path)
+            words = ocr_image(image_path, lang=DEFAULT_LANG, memory_limit=memory_limit)
+    return words
+
+
+def _ocr_data_path(base_folder, folder):
+    """
+    Путь к .npz документа: в папке done/doc/doc.npz или в контейнере
+    done/doc.pack/doc.npz; None, если документ еще не распознан
+    """
+    data_name = f'{folder}.npz'
+    data_file = os.path.join(base_folder, folder, data_name)
+    if os.path.exists(data_file):
+        return data_file
+    pack_path = os.path.join(base_folder, folder + PACK_EXT)
+    if is_pack(pack_path) and pack_member_info(pack_path, data_name) is not None:
+        return os.path.join(pack_path, data_name)
+    return None
+
+
+def _find_duplicate_result(group, image_key, base_folder, ocr_cache, data_cache):
+    """
+    Ищет уже готовый результат OCR для другого изображения из группы дубликатов
+
+    Сначала проверяются изображения, распознанные в текущем запуске,
+    затем .npz файлы других папок и контейнеров .pack.
+
+    Returns:
+        список слов или None
+    """
+    for member in group:
+        if member == image_key:
+            continue
+        if member in ocr_cache:
+            return ocr_cache[member]
+
+        folder, image_name = member.rsplit('/', 1)
+        if folder not in data_cache:
+            data_file = _ocr_data_path(base_folder, folder)
+            data_cache[folder] = load_ocr_data(data_file) if data_file else None
+        data = data_cache[folder]
+        if data is None:
+            continue
+
+        indexes = (data['images'] == image_name).nonzero()[0]
+        if len(indexes):
+            return image_word_list(data, int(indexes[0]))
+    return None
+
+
+def extract_text_from_images(folder_path, duplicates=None, lang=None, memory_limit=None):
+    """
+    Извлекает текст из всех изображений в папке с помощью OCR
+    Поддерживает русский, английский, казахский и узбекский языки
+
+    Если lang не задан, языки выбираются автоматически (func.ocrlang):
+    быстрый проход по уменьшенной копии определяет минимальный набор
+    моделей, выбор запоминается для документа.
+
+    Кроме текстового файла сохраняет <имя_папки>.npz со словами,
+    их координатами и уверенностью распознавания (см. func.ocrdata)
+    
+    Если для папки найдены похожие изображения (func.imghash.find_duplicates),
+    результат OCR одного изображения группы используется для остальных.
+    
+    Результат каждого изображения сразу дописывается в журнал
+    <имя_папки>.journal. Если обработка прервалась, следующий запуск
+    продолжит с места остановки; после сохранения .txt журнал удаляется.
+    
+    Args:
+        folder_path: путь к папке с изображениями
+        duplicates: группы дубликатов из load_duplicates; по умолчанию
+                    загружаются из родительской папки
+        lang: языки Tesseract для всех изображений (например, 'rus+eng')
+        memory_limit: потолок памяти на распознавание одного изображения в байтах;
+                      изображения, которые в него не укладываются, распознаются по частям
+    
+    Returns:
+        путь к созданному текстовому файлу
+    """
+    image_files = list_images(folder_path)
     
     if not image_files:
         print(f"В папке {folder_path} не найдено изображений")
         return None
     
     # Извлекаем имя папки для имени файла
-    folder_name = os.path.basename(folder_path)
-    output_file = os.path.join(folder_path, f'{folder_name}.txt')
+    folder_name = document_name(folder_path)
     
-    # OCR с поддержкой русского и английского
-    all_text = []
+    # Группы похожих изображений
+    base_folder = os.path.dirname(os.path.normpath(folder_path))
+    if duplicates is None:
+        duplicates = load_duplicates(base_folder)
+    ocr_cache = {}
+    data_cache = {}
+    reused = 0
+    languages = DocumentLanguages(folder_path) if lang is None else None
+    
+    results = []
     
-    print(f"Обработка {len(image_files)} изображений...")
-    for i, image_path in enumerate(sorted(image_files), 1):
-        print(f"Обработка изображения {i}/{len(image_files)}: {os.path.basename(image_path)}")
+    with Journal(ocr_journal_path(folder_path)) as journal:
+        finished = load_ocr_journal(journal)
+        if finished:
+            print(f"Продолжение прерванной обработки: уже распознано {len(finished)} изображений")
         
-        try:
-            image = Image.open(image_path)
+        print(f"Обработка {len(image_files)} изображений...")
+        for i, image_path in enumerate(image_files, 1):
+            image_name = os.path.basename(image_path)
+            image_key = f"{folder_name}/{image_name}"
+            if image_name in finished:
+                results.append((image_name, finished[image_name]))
+                if image_key in duplicates:
+                    ocr_cache[image_key] = finished[image_name]
+                continue
             
-            # Извлекаем текст с русским и английским языками
-            text = pytesseract.image_to_string(image, lang='rus+eng')
+            print(f"Обработка изображения {i}/{len(image_files)}: {image_name}")
             
-            if text.strip():
-                all_text.append(f"\n{'='*50}\n")
-                all_text.append(f"Изображение: {os.path.basename(image_path)}\n")
-                all_text.append(f"{'='*50}\n\n")
-                all_text.append(text)
-                all_text.append("\n\n")
+            try:
+                words = None
+                if image_key in duplicates:
+                    words = _find_duplicate_result(duplicates[image_key], image_key, base_folder,
+                                                   ocr_cache, data_cache)
                 
-        except Exception as e:
-            print(f"Ошибка при обработке {image_path}: {e}")
-            continue
+                if words is not None:
+                    reused += 1
+                elif languages is not None:
+                    words = ocr_image_auto(image_path, languages, memory_limit)
+                else:
+                    words = ocr_image(image_path, lang=lang, memory_limit=memory_limit)
+                
+                if image_key in duplicates:
+                    ocr_cache[image_key] = words
+                results.append((image_name, words))
+                journal.append({'image': image_name, 'words': words})
+                    
+            except Exception as e:
+                print(f"Ошибка при обработке {image_path}: {e}")
+                continue
+        
+        # Сохраняем результат
+        output_file = save_folder_text(folder_path, results)
+        journal.remove()
+    
+    if languages is not None and languages.detected:
+        chosen = sorted(set(languages.images.values()))
+        print(f"Определение языка выполнено для {languages.detected} изображений: {', '.join(chosen)}")
     
-    # Сохраняем результат
-    if all_text:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(''.join(all_text))
+    if reused:
+        print(f"Результат OCR взят у похожих изображений: {reused} из {len(image_files)} "
+              f"({reused / len(image_files):.1%} вызовов OCR сэкономлено)")
+    
+    if output_file:
         print(f"\nТекст сохранен в: {output_file}")
+        print(f"Слова с координатами сохранены в: {os.path.splitext(output_file)[0]}.npz")
         return output_file
     else:
         print("Текст не был извлечен из изображений")
         return None
-
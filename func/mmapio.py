@@ -0,0 +1,174 @@
+import io
+import os
+import mmap
+import struct
+from collections import namedtuple
+from contextlib import contextmanager
+
+
+# Сигнатуры изображений, которые можно сохранить как есть, без декодирования
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),          # JPEG
+    (b'\x89PNG\r\n\x1a\n', '.png'),     # PNG
+    (b'GIF87a', '.gif'),                # GIF
+    (b'GIF89a', '.gif'),
+    (b'BM', '.bmp'),                    # BMP
+)
+
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+class _EmptyMap(io.BytesIO):
+    """Замена mmap для пустых файлов, которые нельзя отобразить в память"""
+
+    def __getitem__(self, index):
+        return b''[index]
+
+    def __len__(self):
+        return 0
+
+
+@contextmanager
+def map_file(file):
+    """
+    Отображает открытый двоичный файл в память только для чтения
+
+    Объект mmap поддерживает read/seek/tell, поэтому его можно передавать
+    в PdfReader, zipfile и olefile вместо обычного файла, а срезы
+    memoryview(mm) дают доступ к байтам без копирования.
+    Пустые файлы нельзя отобразить, для них возвращается пустой объект
+    с тем же интерфейсом.
+
+    Args:
+        file: файл, открытый в режиме 'rb'
+    """
+    try:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        yield _EmptyMap()
+        return
+    try:
+        yield mm
+    finally:
+        mm.close()
+
+
+# Открытый документ:
+#   file   - файловый объект с seekable() (для zipfile)
+#   data   - mmap или memoryview для срезов без копирования
+#   stream - файловый объект для PdfReader и olefile (mmap, если файл отображен)
+#   fd     - дескриптор файла для copy_range или None, если документ в памяти
+Source = namedtuple('Source', 'file data stream fd')
+
+
+@contextmanager
+def open_source(source):
+    """
+    Открывает документ, заданный путем или двоичным файловым объектом
+
+    Файлы на диске (и файловые объекты с дескриптором) отображаются
+    в память, для io.BytesIO используется его буфер без копирования.
+
+    Args:
+        source: путь к файлу или файловый объект в режиме 'rb'
+
+    Returns:
+        Source
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as file, map_file(file) as mm:
+            yield Source(file, mm, mm, file.fileno() if isinstance(mm, mmap.mmap) else None)
+        return
+
+    source.seek(0)
+    if hasattr(source, 'getbuffer'):
+        with source.getbuffer() as view:
+            yield Source(source, view, source, None)
+        return
+
+    with map_file(source) as mm:
+        yield Source(source, mm, mm, source.fileno() if isinstance(mm, mmap.mmap) else None)
+
+
+def detect_image_ext(data):
+    """
+    Определяет расширение изображения по сигнатуре
+
+    Args:
+        data: bytes, memoryview или mmap с началом файла
+
+    Returns:
+        расширение ('.jpg', '.png', ...) или None
+    """
+    for signature, ext in IMAGE_SIGNATURES:
+        if data[:len(signature)] == signature:
+            return ext
+    return None
+
+
+def zip_member_offset(mm, zip_info):
+    """
+    Возвращает смещение данных члена ZIP архива в файле
+
+    Args:
+        mm: отображенный в память ZIP файл
+        zip_info: ZipInfo члена архива
+
+    Returns:
+        смещение первого байта данных
+    """
+    # Локальный заголовок ZIP: 30 байт + имя файла + дополнительное поле
+    name_len, extra_len = struct.unpack_from('<HH', mm, zip_info.header_offset + 26)
+    return zip_info.header_offset + 30 + name_len + extra_len
+
+
+def copy_range(src_fd, offset, length, dst_path):
+    """
+    Копирует участок файла в новый файл без чтения данных в Python
+
+    Использует os.copy_file_range или os.sendfile, если они доступны
+    (Linux), иначе пишет срез отображенного в память файла.
+
+    Args:
+        src_fd: дескриптор исходного файла
+        offset: смещение участка
+        length: длина участка
+        dst_path: путь к создаваемому файлу
+
+    Returns:
+        dst_path
+    """
+    with open(dst_path, 'wb') as dst:
+        dst_fd = dst.fileno()
+        remaining = length
+        position = offset
+
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src_fd, dst_fd, remaining, offset_src=position)
+                    if copied == 0:
+                        break
+                    position += copied
+                    remaining -= copied
+            except OSError:
+                # Например, разные файловые системы на старых ядрах
+                pass
+
+        if remaining > 0 and hasattr(os, 'sendfile'):
+            try:
+                while remaining > 0:
+                    copied = os.sendfile(dst_fd, src_fd, position, remaining)
+                    if copied == 0:
+                        break
+                    position += copied
+                    remaining -= copied
+            except OSError:
+                pass
+
+        if remaining > 0:
+            # Запасной вариант: запись среза отображенного в память файла
+            with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view, \
+                    view[position:position + remaining] as part:
+                dst.write(part)
+
+    return dst_path
@@ -0,0 +1,276 @@
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+from func.checkpoint import atomic_open
+from func.pack import split_pack_path, pack_member_info, open_member
+
+
+# Одна запись на каждое распознанное слово
+WORD_DTYPE = np.dtype([
+    ('image', '<u4'),       # индекс изображения в массиве images
+    ('block', '<u2'),
+    ('par', '<u2'),
+    ('line', '<u2'),
+    ('word', '<u2'),
+    ('left', '<i4'),
+    ('top', '<i4'),
+    ('width', '<i4'),
+    ('height', '<i4'),
+    ('conf', '<f4'),
+    ('text_start', '<u8'),  # смещение слова в байтах в массиве text
+    ('text_len', '<u4'),    # длина слова в байтах
+])
+
+SEPARATOR = '=' * 50
+
+
+def words_from_tesseract(data):
+    """
+    Преобразует результат pytesseract.image_to_data (Output.DICT) в список слов
+
+    Args:
+        data: словарь колонок, который возвращает image_to_data
+
+    Returns:
+        список кортежей (block, par, line, word, left, top, width, height, conf, text)
+    """
+    words = []
+    for i, text in enumerate(data['text']):
+        # Уровень 5 - это слова, остальные уровни (страница, блок, строка) пропускаем
+        if int(data['level'][i]) != 5 or not text or not text.strip():
+            continue
+        words.append((
+            int(data['block_num'][i]),
+            int(data['par_num'][i]),
+            int(data['line_num'][i]),
+            int(data['word_num'][i]),
+            int(data['left'][i]),
+            int(data['top'][i]),
+            int(data['width'][i]),
+            int(data['height'][i]),
+            float(data['conf'][i]),
+            text.strip(),
+        ))
+    return words
+
+
+def words_to_text(words):
+    """
+    Собирает текст изображения из списка слов: слова одной строки через пробел,
+    строки через перевод строки, абзацы и блоки через пустую строку
+
+    Args:
+        words: список слов в формате words_from_tesseract
+
+    Returns:
+        текст изображения
+    """
+    parts = []
+    prev = None
+    for block, par, line, _, _, _, _, _, _, text in words:
+        if prev is not None:
+            if (block, par) != prev[:2]:
+                parts.append('\n\n')
+            elif line != prev[2]:
+                parts.append('\n')
+            else:
+                parts.append(' ')
+        parts.append(text)
+        prev = (block, par, line)
+    return ''.join(parts)
+
+
+def format_image_text(image_name, text):
+    """Оформляет текст одного изображения так же, как в итоговом .txt файле"""
+    return f"\n{SEPARATOR}\nИзображение: {image_name}\n{SEPARATOR}\n\n{text}\n\n"
+
+
+def save_ocr_data(path, results):
+    """
+    Сохраняет слова с координатами и уверенностью в колоночный .npz файл
+
+    В файле хранятся массивы:
+        images  - имена изображений
+        spans   - (начало, длина) текста каждого изображения в массиве text
+        words   - структурированный массив WORD_DTYPE
+        text    - текст всех изображений в UTF-8; слова ссылаются на него смещениями
+
+    Архив пишется без сжатия, поэтому load_ocr_data может отобразить
+    массивы в память без чтения файла целиком.
+
+    Args:
+        path: путь к .npz файлу или открытый двоичный файл
+        results: список пар (имя изображения, список слов)
+
+    Returns:
+        путь к сохраненному файлу
+    """
+    names = []
+    spans = []
+    rows = []
+    blob = bytearray()
+
+    for image_index, (image_name, words) in enumerate(results):
+        names.append(image_name)
+        image_start = len(blob)
+        prev = None
+        for block, par, line, word, left, top, width, height, conf, text in words:
+            if prev is not None:
+                if (block, par) != prev[:2]:
+                    blob += b'\n\n'
+                elif line != prev[2]:
+                    blob += b'\n'
+                else:
+                    blob += b' '
+            encoded = text.encode('utf-8')
+            rows.append((image_index, block, par, line, word, left, top, width, height, conf,
+                         len(blob), len(encoded)))
+            blob += encoded
+            prev = (block, par, line)
+        spans.append((image_start, len(blob) - image_start))
+
+    images = np.array(names, dtype=str) if names else np.empty(0, dtype='<U1')
+    arrays = dict(
+        images=images,
+        spans=np.array(spans, dtype='<u8').reshape(-1, 2),
+        words=np.array(rows, dtype=WORD_DTYPE),
+        text=np.frombuffer(bytes(blob), dtype=np.uint8),
+    )
+    if hasattr(path, 'write'):
+        # Например, io.BytesIO для записи в упакованный контейнер
+        np.savez(path, **arrays)
+        return path
+    with atomic_open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    return path
+
+
+def _member_data_offset(f, zip_info, base=0):
+    """Смещение данных члена ZIP архива, который начинается в файле со смещения base"""
+    # Локальный заголовок ZIP: 30 байт + имя файла + дополнительное поле
+    f.seek(base + zip_info.header_offset)
+    header = f.read(30)
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    return base + zip_info.header_offset + 30 + name_len + extra_len
+
+
+def _mmap_npz_member(npz_path, zip_info, base=0):
+    """
+    Отображает в память массив из несжатого члена .npz архива
+
+    base - смещение .npz внутри файла npz_path (для .npz в контейнере .pack)
+    """
+    with open(npz_path, 'rb') as f:
+        f.seek(_member_data_offset(f, zip_info, base))
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if dtype.hasobject or 0 in shape:
+        return None
+    order = 'F' if fortran_order else 'C'
+    return np.memmap(npz_path, dtype=dtype, mode='r', offset=offset, shape=shape, order=order)
+
+
+def load_ocr_data(path, mmap=True):
+    """
+    Загружает .npz файл, созданный save_ocr_data
+
+    .npz внутри упакованного контейнера (done/doc.pack/doc.npz) тоже
+    отображается в память - по смещению внутри контейнера.
+
+    Args:
+        path: путь к .npz файлу
+        mmap: отображать массивы в память вместо чтения с диска
+
+    Returns:
+        словарь с массивами images, spans, words, text
+    """
+    file_path, base = path, 0
+    pack_path, name = split_pack_path(path)
+    if pack_path is not None:
+        info = pack_member_info(pack_path, name)
+        if info is None:
+            raise FileNotFoundError(path)
+        if info.compress_type == zipfile.ZIP_STORED:
+            file_path = pack_path
+            with open(pack_path, 'rb') as f:
+                base = _member_data_offset(f, info)
+        else:
+            mmap = False
+
+    data = {}
+    with open_member(path) as source:
+        with zipfile.ZipFile(source) as archive:
+            members = {os.path.splitext(info.filename)[0]: info for info in archive.infolist()}
+
+        with np.load(source) as npz:
+            for key in ('images', 'spans', 'words', 'text'):
+                array = None
+                if mmap and members[key].compress_type == zipfile.ZIP_STORED:
+                    array = _mmap_npz_member(file_path, members[key], base)
+                data[key] = array if array is not None else npz[key]
+    return data
+
+
+def image_text(data, index):
+    """Возвращает распознанный текст изображения по его индексу"""
+    start, length = data['spans'][index]
+    return bytes(data['text'][start:start + length]).decode('utf-8')
+
+
+def image_words(data, index):
+    """Возвращает слова изображения по его индексу (срез структурированного массива)"""
+    words = data['words']
+    mask = words['image'] == index
+    return words[mask]
+
+
+def image_word_list(data, index):
+    """
+    Возвращает слова изображения в формате words_from_tesseract
+
+    Args:
+        data: словарь, который возвращает load_ocr_data
+        index: индекс изображения
+
+    Returns:
+        список кортежей (block, par, line, word, left, top, width, height, conf, text)
+    """
+    return [
+        (int(w['block']), int(w['par']), int(w['line']), int(w['word']),
+         int(w['left']), int(w['top']), int(w['width']), int(w['height']),
+         float(w['conf']), word_text(data, w))
+        for w in image_words(data, index)
+    ]
+
+
+def word_text(data, word):
+    """Возвращает текст слова (одна запись массива words)"""
+    start = int(word['text_start'])
+    return bytes(data['text'][start:start + int(word['text_len'])]).decode('utf-8')
+
+
+def ocr_data_to_text(data):
+    """
+    Восстанавливает содержимое итогового .txt файла из .npz данных
+
+    Args:
+        data: словарь, который возвращает load_ocr_data
+
+    Returns:
+        текст в том же формате, что пишет extract_text_from_images
+    """
+    all_text = []
+    for index, image_name in enumerate(data['images']):
+        text = image_text(data, index)
+        if text.strip():
+            all_text.append(format_image_text(str(image_name), text))
+    return ''.join(all_text)
@@ -0,0 +1,299 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from functools import lru_cache
+
+import pytesseract
+
+from func.checkpoint import atomic_open
+from func.pack import sidecar_path
+from func.tiles import open_bounded
+
+
+# Набор языков, если определить язык не удалось
+DEFAULT_LANG = 'rus+eng'
+
+# Модели для предварительного прохода по уменьшенной копии
+DETECT_LANG = 'rus+eng'
+
+# Модели второго прохода - только если в тексте первого прохода есть
+# признаки казахских или узбекских букв
+EXTRA_CYRILLIC_LANGS = ('kaz', 'uzb_cyrl')
+
+# Длинная сторона уменьшенной копии для предварительного прохода
+DETECT_MAX_SIDE = 800
+
+# Сколько слов со смешанными кириллицей и латиницей нужно для второго прохода
+MIN_MIXED_WORDS = 2
+
+# Минимум букв, по которым можно судить о языке
+MIN_LETTERS = 20
+
+# Доля букв второй письменности, начиная с которой нужны обе модели
+MIXED_SCRIPT_SHARE = 0.05
+
+# Сколько изображений подряд должны совпасть по языку, чтобы дальше
+# не определять язык для остальных изображений документа
+CONSENSUS_IMAGES = 3
+
+# Если средняя уверенность OCR ниже, изображение распознается заново с DEFAULT_LANG
+MIN_CONFIDENCE = 60
+
+_CYRILLIC = re.compile(r'[Ѐ-ӿ]')
+_LATIN = re.compile(r'[A-Za-z]')
+# Буквы казахского алфавита, которых нет в русском
+_KAZAKH = re.compile(r'[әғқңөұүһіӘҒҚҢӨҰҮҺІ]')
+# Буквы узбекской кириллицы, которых нет ни в русском, ни в казахском
+_UZBEK_CYRILLIC = re.compile(r'[ўҳЎҲ]')
+# Модель rus распознает буквы вроде і, ү, ө как похожие латинские,
+# поэтому казахский текст дает слова из смеси кириллицы и латиницы
+_MIXED_WORD = re.compile(r'\b(?=\w*[Ѐ-ӿ])(?=\w*[A-Za-z])\w+\b')
+# Узбекская латиница: oʻ и gʻ (апостроф распознается по-разному)
+_UZBEK_LATIN = re.compile(r"[oOgG][ʻʼ‘’'`]")
+
+
+@lru_cache(maxsize=None)
+def available_languages():
+    """Языки, для которых установлены модели Tesseract"""
+    try:
+        return frozenset(pytesseract.get_languages(config=''))
+    except Exception:
+        return frozenset(DEFAULT_LANG.split('+'))
+
+
+def languages_from_text(text):
+    """
+    Выбирает минимальный набор языков Tesseract по тексту предварительного прохода
+
+    Сначала по доле кириллических и латинских букв определяется
+    письменность, затем по характерным буквам - язык внутри нее.
+
+    Args:
+        text: текст, распознанный на уменьшенной копии
+
+    Returns:
+        строка языков ('rus', 'kaz+eng', ...) или None, если букв слишком мало
+    """
+    cyrillic = len(_CYRILLIC.findall(text))
+    latin = len(_LATIN.findall(text))
+    letters = cyrillic + latin
+    if letters < MIN_LETTERS:
+        return None
+
+    langs = []
+    if cyrillic / letters >= MIXED_SCRIPT_SHARE:
+        if len(_UZBEK_CYRILLIC.findall(text)) >= 2:
+            langs.append('uzb_cyrl')
+        elif len(_KAZAKH.findall(text)) >= max(2, cyrillic // 100):
+            langs.append('kaz')
+        else:
+            langs.append('rus')
+    if latin / letters >= MIXED_SCRIPT_SHARE:
+        if len(_UZBEK_LATIN.findall(text)) >= 2:
+            langs.append('uzb')
+        else:
+            langs.append('eng')
+    return '+'.join(langs)
+
+
+def detect_languages(image_path):
+    """
+    Определяет языки изображения быстрым проходом OCR по уменьшенной копии
+
+    Первый проход делается только с rus+eng. Модели kaz и uzb_cyrl
+    подключаются вторым проходом по той же копии, если в тексте
+    встретились слова из смеси кириллицы и латиницы - так модель rus
+    передает буквы, которых нет в русском алфавите.
+
+    Args:
+        image_path: путь к изображению
+
+    Returns:
+        строка языков для Tesseract; DEFAULT_LANG, если язык определить
+        не удалось или нужной модели нет
+    """
+    available = available_languages()
+
+    with open_bounded(image_path) as image:
+        # Для JPEG декодируем сразу в уменьшенном масштабе
+        image.draft('L', (DETECT_MAX_SIDE, DETECT_MAX_SIDE))
+        # Уменьшаем до преобразования, чтобы не делать полноразмерную копию
+        image.thumbnail((DETECT_MAX_SIDE, DETECT_MAX_SIDE))
+        thumbnail = image.convert('L')
+
+    text = pytesseract.image_to_string(thumbnail, lang=DETECT_LANG, config='--psm 3')
+
+    extra = [lang for lang in EXTRA_CYRILLIC_LANGS if lang in available]
+    if extra and len(_MIXED_WORD.findall(text)) >= MIN_MIXED_WORDS:
+        text = pytesseract.image_to_string(thumbnail, lang='+'.join(['rus'] + extra), config='--psm 3')
+
+    langs = languages_from_text(text)
+    if langs is None or not all(lang in available for lang in langs.split('+')):
+        return DEFAULT_LANG
+    return langs
+
+
+def mean_confidence(words):
+    """Средняя уверенность распознавания слов или None, если слов нет"""
+    confs = [word[8] for word in words if word[8] >= 0]
+    if not confs:
+        return None
+    return sum(confs) / len(confs)
+
+
+class DocumentLanguages:
+    """
+    Выбор языков OCR для изображений одного документа
+
+    Выбор сохраняется в <папка>/<папка>.lang.json (для контейнера .pack -
+    рядом с ним), поэтому при повторной обработке язык заново не
+    определяется. Когда CONSENSUS_IMAGES изображений подряд получили
+    один и тот же набор языков, он используется для остальных изображений
+    документа без предварительного прохода. Методы можно вызывать из
+    нескольких потоков.
+    """
+
+    def __init__(self, folder_path):
+        self.path = sidecar_path(folder_path, '.lang.json')
+        self.document = None
+        self.images = {}
+        self.detected = 0
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+                self.document = cache.get('document')
+                self.images = cache.get('images', {})
+            except (OSError, ValueError):
+                pass
+
+    def _save(self):
+        with atomic_open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'document': self.document, 'images': self.images}, f, ensure_ascii=False, indent=1)
+
+    def choose(self, image_path):
+        """
+        Возвращает набор языков для изображения
+
+        Args:
+            image_path: путь к изображению
+
+        Returns:
+            строка языков для Tesseract
+        """
+        image_name = os.path.basename(image_path)
+        with self._lock:
+            if image_name in self.images:
+                return self.images[image_name]
+            if self.document:
+                return self.document
+
+        langs = detect_languages(image_path)
+
+        with self._lock:
+            self.detected += 1
+            self.images[image_name] = langs
+            recent = list(self.images.values())[-CONSENSUS_IMAGES:]
+            if len(recent) == CONSENSUS_IMAGES and len(set(recent)) == 1:
+                self.document = recent[0]
+            self._save()
+        return langs
+
+    def reject(self, image_path):
+        """
+        Отмечает, что выбранный набор языков не подошел изображению
+
+        Изображение дальше распознается с DEFAULT_LANG, а общий для
+        документа выбор сбрасывается - язык снова определяется для каждого
+        следующего изображения.
+        """
+        with self._lock:
+            self.images[os.path.basename(image_path)] = DEFAULT_LANG
+            self.document = None
+            self._save()
+
+
+def benchmark(folders, repeat=1):
+    """
+    Сравнивает скорость OCR с DEFAULT_LANG и с автоматически выбранными языками
+
+    Во втором случае в время входит и предварительный проход. Кэш
+    языков документа не используется, чтобы измерение было честным.
+
+    Args:
+        folders: папки с изображениями
+        repeat: сколько раз распознавать каждое изображение
+
+    Returns:
+        словарь: images, default_seconds, auto_seconds, detect_seconds, speedup, languages
+    """
+    from func.imgtotext import list_images, ocr_image
+
+    images = [image for folder in folders for image in list_images(folder)]
+    default_seconds = 0.0
+    auto_seconds = 0.0
+    detect_seconds = 0.0
+    languages = {}
+
+    for image_path in images:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ocr_image(image_path, lang=DEFAULT_LANG)
+            default_seconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            langs = detect_languages(image_path)
+            detect_seconds += time.perf_counter() - start
+            words = ocr_image(image_path, lang=langs)
+            confidence = mean_confidence(words)
+            if langs != DEFAULT_LANG and confidence is not None and confidence < MIN_CONFIDENCE:
+                ocr_image(image_path, lang=DEFAULT_LANG)
+                langs = DEFAULT_LANG
+            auto_seconds += time.perf_counter() - start
+        languages[langs] = languages.get(langs, 0) + 1
+
+    speedup = default_seconds / auto_seconds if auto_seconds else None
+    print(f"Изображений: {len(images)}")
+    print(f"OCR с {DEFAULT_LANG}: {default_seconds:.1f} с")
+    print(f"OCR с автоопределением языка: {auto_seconds:.1f} с (из них определение: {detect_seconds:.1f} с)")
+    if speedup:
+        print(f"Ускорение: {speedup:.2f}x")
+    for langs, count in sorted(languages.items(), key=lambda item: -item[1]):
+        print(f"  {langs}: {count}")
+
+    return {
+        'images': len(images),
+        'default_seconds': default_seconds,
+        'auto_seconds': auto_seconds,
+        'detect_seconds': detect_seconds,
+        'speedup': speedup,
+        'languages': languages,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Автоопределение языка для OCR')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    detect_parser = subparsers.add_parser('detect', help='определить языки изображений')
+    detect_parser.add_argument('images', nargs='+', help='пути к изображениям')
+
+    bench_parser = subparsers.add_parser('bench', help='сравнить скорость OCR с rus+eng и с автоопределением')
+    bench_parser.add_argument('folders', nargs='+', help='папки с изображениями')
+    bench_parser.add_argument('--repeat', type=int, default=1, help='повторов на изображение')
+
+    args = parser.parse_args(argv)
+    if args.command == 'detect':
+        for image_path in args.images:
+            print(f"{image_path}: {detect_languages(image_path)}")
+    else:
+        benchmark(args.folders, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import os
+import time
+import shutil
+import struct
+import zipfile
+import threading
+from contextlib import contextmanager, ExitStack
+
+from PIL import Image
+
+from func.checkpoint import atomic_open
+from func.mmapio import copy_range
+
+
+# Упакованный результат документа: ZIP без сжатия <output_root>/<документ>.pack
+PACK_EXT = '.pack'
+
+# Файлы, которые не переносятся в контейнер (журналы незавершенной работы)
+_SKIP_SUFFIXES = ('.journal', '.tmp')
+
+# Копия центрального каталога на время дописывания: <документ>.pack.tail
+_TAIL_SUFFIX = '.tail'
+
+# Открытые контейнеры: путь -> (mtime, size, ZipFile)
+_open_packs = {}
+_open_packs_lock = threading.Lock()
+
+
+def is_pack(path):
+    """Проверяет, является ли путь упакованным контейнером документа"""
+    return path.lower().endswith(PACK_EXT) and os.path.isfile(path)
+
+
+def document_name(folder_path):
+    """Имя документа по папке или контейнеру: done/doc и done/doc.pack -> doc"""
+    name = os.path.basename(os.path.normpath(folder_path))
+    if name.lower().endswith(PACK_EXT):
+        name = name[:-len(PACK_EXT)]
+    return name
+
+
+def sidecar_path(folder_path, suffix):
+    """
+    Путь к служебному файлу документа (журнал, выбор языков)
+
+    Для папки файл лежит внутри нее (done/doc/doc.journal), для
+    контейнера - рядом с ним (done/doc.journal): служебные файлы
+    меняются после каждого изображения, а контейнер дописывается
+    только готовыми результатами.
+    """
+    name = document_name(folder_path)
+    if is_pack(folder_path):
+        return os.path.join(os.path.dirname(os.path.normpath(folder_path)), f'{name}{suffix}')
+    return os.path.join(folder_path, f'{name}{suffix}')
+
+
+def split_pack_path(path):
+    """
+    Разбирает путь к файлу внутри контейнера: done/doc.pack/img.png
+
+    Returns:
+        пару (путь к контейнеру, имя члена) или (None, path) для обычного файла
+    """
+    pack_path = os.path.dirname(path)
+    if pack_path.lower().endswith(PACK_EXT) and os.path.isfile(pack_path):
+        return pack_path, os.path.basename(path)
+    return None, path
+
+
+def _recover_pack(pack_path):
+    """
+    Возвращает контейнер к состоянию до прерванного дописывания
+
+    Дописывание затирает центральный каталог ZIP, поэтому перед ним
+    каталог сохраняется в <контейнер>.tail. Если эта копия осталась,
+    дописывание не завершилось: новые файлы отрезаются, каталог
+    записывается обратно.
+    """
+    tail_path = pack_path + _TAIL_SUFFIX
+    if not os.path.exists(tail_path):
+        return
+    with open(tail_path, 'rb') as f:
+        data = f.read()
+    start_dir, = struct.unpack('<Q', data[:8])
+    with open(pack_path, 'r+b') as f:
+        f.truncate(start_dir)
+        f.seek(start_dir)
+        f.write(data[8:])
+        f.flush()
+        os.fsync(f.fileno())
+    os.remove(tail_path)
+
+
+def _zip(pack_path):
+    """Открытый ZipFile контейнера; пересоздается, если контейнер заменили"""
+    stat = os.stat(pack_path)
+    with _open_packs_lock:
+        cached = _open_packs.get(pack_path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        if cached:
+            cached[2].close()
+        _recover_pack(pack_path)
+        stat = os.stat(pack_path)
+        archive = zipfile.ZipFile(pack_path)
+        _open_packs[pack_path] = (stat.st_mtime_ns, stat.st_size, archive)
+        return archive
+
+
+def _forget(pack_path):
+    with _open_packs_lock:
+        cached = _open_packs.pop(pack_path, None)
+    if cached:
+        cached[2].close()
+
+
+def list_pack(pack_path):
+    """Имена файлов в контейнере в порядке записи"""
+    return [info.filename for info in _zip(pack_path).infolist() if not info.is_dir()]
+
+
+def pack_member_info(pack_path, name):
+    """ZipInfo файла в контейнере или None"""
+    try:
+        return _zip(pack_path).getinfo(name)
+    except KeyError:
+        return None
+
+
+def open_member(path):
+    """
+    Открывает файл из контейнера (done/doc.pack/doc.npz) или с диска для чтения
+
+    Файл из контейнера поддерживает seek, поэтому его можно передавать
+    в zipfile, numpy и Pillow.
+    """
+    pack_path, name = split_pack_path(path)
+    if pack_path is None:
+        return open(path, 'rb')
+    return _zip(pack_path).open(name)
+
+
+def read_member(path):
+    """Читает файл из контейнера (done/doc.pack/doc.txt) или с диска"""
+    pack_path, name = split_pack_path(path)
+    if pack_path is None:
+        with open(path, 'rb') as f:
+            return f.read()
+    return _zip(pack_path).read(name)
+
+
+@contextmanager
+def open_image(image_path):
+    """
+    Открывает изображение с диска или прямо из контейнера
+
+    Файлы в контейнере хранятся без сжатия, поэтому изображение
+    читается с произвольным доступом, без распаковки во временный файл.
+
+    Args:
+        image_path: путь к изображению или done/doc.pack/<имя>
+    """
+    pack_path, name = split_pack_path(image_path)
+    if pack_path is None:
+        with Image.open(image_path) as image:
+            yield image
+        return
+
+    with _zip(pack_path).open(name) as member, Image.open(member) as image:
+        yield image
+
+
+class FolderWriter:
+    """
+    Запись результатов документа в папку
+
+    Экстракторы пишут файлы через writer: FolderWriter для папки или
+    PackWriter для контейнера. Путь к папке, переданный экстрактору,
+    превращается в FolderWriter (output_writer).
+
+    Args:
+        folder_path: папка для результатов
+        create: создать папку, если ее нет (False - папка создана заранее)
+    """
+
+    def __init__(self, folder_path, create=True):
+        self.path = folder_path
+        if create:
+            os.makedirs(folder_path, exist_ok=True)
+
+    def join(self, name):
+        """Путь к файлу результата"""
+        return os.path.join(self.path, name)
+
+    def exists(self, name):
+        return os.path.exists(self.join(name))
+
+    def open(self, name, atomic=False):
+        """Открывает файл для записи; atomic - файл появится только записанным целиком"""
+        if atomic:
+            return atomic_open(self.join(name), 'wb')
+        return open(self.join(name), 'wb')
+
+    def write_range(self, source, offset, length, name):
+        """Копирует участок исходного файла (Source из open_source) в файл результата"""
+        if source.fd is not None:
+            return copy_range(source.fd, offset, length, self.join(name))
+        with self.open(name) as f:
+            f.write(memoryview(source.data)[offset:offset + length])
+        return self.join(name)
+
+
+class PackWriter:
+    """
+    Запись результатов документа прямо в контейнер <папка>.pack
+
+    Передается экстрактору вместо папки: файлы пишутся в контейнер
+    по мере извлечения, промежуточная папка не создается. Контейнер
+    появляется атомарно при выходе из with; если извлечение прервалось,
+    прежний контейнер не меняется. Пути результатов - пути внутри
+    контейнера (done/doc.pack/<имя>). Файлы пишутся по одному.
+    Папка контейнера создается, если ее нет.
+
+    Args:
+        pack_path: путь к контейнеру
+    """
+
+    def __init__(self, pack_path):
+        self.path = pack_path
+        self.names = set()
+        self._stack = ExitStack()
+        self._archive = None
+
+    def __enter__(self):
+        _forget(self.path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        f = self._stack.enter_context(atomic_open(self.path, 'wb'))
+        self._archive = self._stack.enter_context(zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED))
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def join(self, name):
+        """Путь к файлу результата внутри контейнера"""
+        return os.path.join(self.path, name)
+
+    def exists(self, name):
+        return name in self.names
+
+    def open(self, name, atomic=False):
+        """Открывает файл контейнера для записи; контейнер и так появляется атомарно"""
+        self.names.add(name)
+        return self._archive.open(zipfile.ZipInfo(name, time.localtime()[:6]), 'w')
+
+    def write_range(self, source, offset, length, name):
+        """Копирует участок исходного файла (Source из open_source) в контейнер"""
+        with self.open(name) as f:
+            f.write(memoryview(source.data)[offset:offset + length])
+        return self.join(name)
+
+
+def output_writer(output):
+    """Writer для экстрактора: переданный PackWriter/FolderWriter или FolderWriter для пути к папке"""
+    if isinstance(output, (FolderWriter, PackWriter)):
+        return output
+    return FolderWriter(output)
+
+
+def pack_folder(folder_path, remove=True):
+    """
+    Упаковывает папку документа в один контейнер <папка>.pack
+
+    Контейнер - обычный ZIP без сжатия: изображения уже сжаты, а без
+    сжатия любой файл читается напрямую по смещению. Файлы пишутся
+    одной последовательной записью, контейнер появляется атомарно.
+
+    Args:
+        folder_path: папка с результатами документа
+        remove: удалить папку после упаковки
+
+    Returns:
+        путь к контейнеру
+    """
+    folder_path = os.path.normpath(folder_path)
+    pack_path = folder_path + PACK_EXT
+    names = sorted(
+        name for name in os.listdir(folder_path)
+        if os.path.isfile(os.path.join(folder_path, name)) and not name.endswith(_SKIP_SUFFIXES)
+    )
+
+    _forget(pack_path)
+    with atomic_open(pack_path, 'wb') as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as archive:
+        for name in names:
+            archive.write(os.path.join(folder_path, name), name)
+
+    if remove:
+        shutil.rmtree(folder_path)
+    return pack_path
+
+
+def update_pack(pack_path, members):
+    """
+    Добавляет или заменяет файлы в контейнере
+
+    Новые файлы дописываются в конец контейнера (ZIP в режиме 'a'):
+    уже записанные изображения не копируются. На время дописывания
+    центральный каталог сохраняется в <контейнер>.tail, поэтому при
+    сбое контейнер возвращается к прежней версии (_recover_pack).
+    Если файл с таким именем уже есть, контейнер переписывается целиком.
+
+    Args:
+        pack_path: путь к контейнеру
+        members: словарь {имя: bytes}
+    """
+    _forget(pack_path)
+    _recover_pack(pack_path)
+    with zipfile.ZipFile(pack_path) as archive:
+        replaced = any(name in members for name in archive.namelist())
+        start_dir = archive.start_dir
+    if replaced:
+        _rewrite_pack(pack_path, members)
+        return
+
+    tail_path = pack_path + _TAIL_SUFFIX
+    with open(pack_path, 'rb') as f:
+        f.seek(start_dir)
+        tail = f.read()
+    with atomic_open(tail_path, 'wb') as f:
+        f.write(struct.pack('<Q', start_dir) + tail)
+
+    with open(pack_path, 'r+b') as f:
+        with zipfile.ZipFile(f, 'a', zipfile.ZIP_STORED) as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.remove(tail_path)
+
+
+def _rewrite_pack(pack_path, members):
+    """Переписывает контейнер целиком во временный файл, заменяя файлы members"""
+    with atomic_open(pack_path, 'wb') as f:
+        with zipfile.ZipFile(pack_path) as old, zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as archive:
+            for info in old.infolist():
+                if info.filename in members:
+                    continue
+                with old.open(info) as src, \
+                        archive.open(zipfile.ZipInfo(info.filename, info.date_time), 'w') as dst:
+                    shutil.copyfileobj(src, dst)
+            for name, data in members.items():
+                archive.writestr(name, data)
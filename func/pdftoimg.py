@@ -1,88 +1,154 @@
 import os
+from contextlib import ExitStack
 from pypdf import PdfReader
 from PIL import Image
 import io
 
+from func.mmapio import open_source
+from func.checkpoint import Journal
+from func.pack import output_writer, FolderWriter
 
-def extract_images_from_pdf(pdf_path, output_folder):
+
+def pdf_page_count(pdf_path):
+    """Возвращает количество страниц PDF файла"""
+    with open_source(pdf_path) as source:
+        return len(PdfReader(source.stream).pages)
+
+
+def _extract_page_images(page, page_num, output):
     """
-    Извлекает изображения из PDF файла и сохраняет их в указанную папку
+    Сохраняет изображения одной страницы PDF
     
     Args:
-        pdf_path: путь к PDF файлу
-        output_folder: папка для сохранения изображений
+        output: writer папки или контейнера (func.pack)
     
     Returns:
         список путей к сохраненным изображениям
     """
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
     saved_images = []
-    reader = PdfReader(pdf_path)
     
-    for page_num, page in enumerate(reader.pages):
+    resources = page.get('/Resources', {})
+    if not resources:
+        return []
+    
+    xObject = resources.get('/XObject')
+    if not xObject:
+        return []
+    
+    xObject_dict = xObject.get_object() if hasattr(xObject, 'get_object') else xObject
+    
+    for obj_name in xObject_dict:
         try:
-            resources = page.get('/Resources', {})
-            if not resources:
-                continue
+            obj = xObject_dict[obj_name]
+            if hasattr(obj, 'get_object'):
+                obj = obj.get_object()
             
-            xObject = resources.get('/XObject')
-            if not xObject:
+            if not isinstance(obj, dict):
                 continue
             
-            xObject_dict = xObject.get_object() if hasattr(xObject, 'get_object') else xObject
-            
-            for obj_name in xObject_dict:
+            if obj.get('/Subtype') == '/Image':
                 try:
-                    obj = xObject_dict[obj_name]
-                    if hasattr(obj, 'get_object'):
-                        obj = obj.get_object()
+                    data = obj.get_data()
+                    
+                    # Определяем расширение файла
+                    filter_type = obj.get('/Filter')
+                    if isinstance(filter_type, list):
+                        filter_type = filter_type[0]
+                    
+                    # JPEG изображения
+                    if filter_type == '/DCTDecode':
+                        ext = '.jpg'
+                    # PNG изображения  
+                    elif filter_type == '/FlateDecode':
+                        ext = '.png'
+                    # CCITTFaxDecode (обычно TIFF)
+                    elif filter_type == '/CCITTFaxDecode':
+                        ext = '.tiff'
+                    # Другие форматы
+                    else:
+                        ext = '.png'
+                    
+                    # Сохраняем изображение
+                    clean_name = obj_name.replace('/', '_').replace(' ', '_')
+                    image_name = f'image_page{page_num + 1}_{clean_name}{ext}'
+                    
+                    # Файл появляется только записанным целиком
+                    with output.open(image_name, atomic=True) as img_file:
+                        img_file.write(data)
                     
-                    if not isinstance(obj, dict):
-                        continue
+                    saved_images.append(output.join(image_name))
                     
-                    if obj.get('/Subtype') == '/Image':
-                        try:
-                            data = obj.get_data()
-                            
-                            # Определяем расширение файла
-                            filter_type = obj.get('/Filter')
-                            if isinstance(filter_type, list):
-                                filter_type = filter_type[0]
-                            
-                            # JPEG изображения
-                            if filter_type == '/DCTDecode':
-                                ext = '.jpg'
-                            # PNG изображения  
-                            elif filter_type == '/FlateDecode':
-                                ext = '.png'
-                            # CCITTFaxDecode (обычно TIFF)
-                            elif filter_type == '/CCITTFaxDecode':
-                                ext = '.tiff'
-                            # Другие форматы
-                            else:
-                                ext = '.png'
-                            
-                            # Сохраняем изображение
-                            clean_name = obj_name.replace('/', '_').replace(' ', '_')
-                            image_path = os.path.join(output_folder, f'image_page{page_num + 1}_{clean_name}{ext}')
-                            
-                            with open(image_path, 'wb') as img_file:
-                                img_file.write(data)
-                            
-                            saved_images.append(image_path)
-                            
-                        except Exception as e:
-                            print(f"Ошибка при извлечении изображения {obj_name}: {e}")
-                            continue
-                            
                 except Exception as e:
+                    print(f"Ошибка при извлечении изображения {obj_name}: {e}")
                     continue
                     
         except Exception as e:
-            print(f"Ошибка при обработке страницы {page_num + 1}: {e}")
             continue
     
     return saved_images
 
+
+def _journal_path(output_folder, pages):
+    """Путь к журналу извлечения; у каждой части большого PDF свой журнал"""
+    if pages is None or not len(pages):
+        return os.path.join(output_folder, '.extract.journal')
+    return os.path.join(output_folder, f'.extract_{pages[0] + 1}-{pages[-1] + 1}.journal')
+
+
+def extract_images_from_pdf(pdf_path, output_folder, pages=None):
+    """
+    Извлекает изображения из PDF файла и сохраняет их в указанную папку
+    
+    PDF отображается в память и читается через mmap, а не через
+    буферизованный файл.
+    
+    При записи в папку каждая обработанная страница записывается
+    в журнал в output_folder. Если извлечение прервалось, повторный
+    вызов пропустит готовые страницы; после завершения журнал удаляется.
+    Контейнер (func.pack.PackWriter) появляется только целиком, поэтому
+    журнал для него не ведется.
+    
+    Args:
+        pdf_path: путь к PDF файлу или открытый двоичный файл
+        output_folder: папка для сохранения изображений или writer
+                       (func.pack.PackWriter - запись прямо в контейнер)
+        pages: номера страниц (с нуля) для обработки, по умолчанию все;
+               позволяет делить большой PDF между несколькими процессами
+    
+    Returns:
+        список путей к сохраненным изображениям
+    """
+    output = output_writer(output_folder)
+    
+    saved_images = []
+    with open_source(pdf_path) as source, ExitStack() as stack:
+        journal = None
+        finished = {}
+        if isinstance(output, FolderWriter):
+            journal = stack.enter_context(Journal(_journal_path(output.path, pages)))
+            # Страницы, обработанные до прерывания предыдущего запуска
+            finished = {record['page']: record['images'] for record in journal.records}
+        
+        reader = PdfReader(source.stream)
+        
+        page_numbers = range(len(reader.pages)) if pages is None else pages
+        for page_num in page_numbers:
+            if page_num in finished:
+                saved_images.extend(output.join(name) for name in finished[page_num])
+                continue
+            
+            try:
+                page_images = _extract_page_images(reader.pages[page_num], page_num, output)
+            except Exception as e:
+                print(f"Ошибка при обработке страницы {page_num + 1}: {e}")
+                page_images = []
+            
+            if journal is not None:
+                journal.append({'page': page_num, 'images': [os.path.basename(path) for path in page_images]})
+            saved_images.extend(page_images)
+        
+        if journal is not None:
+            journal.remove()
+    
+    return saved_images
+
@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from func.tasks import plan_tasks, create_folders, extract_task, ExtractResult
+from func.imgtotext import ocr_image_auto, save_folder_text, ocr_journal_path, load_ocr_journal
+from func.checkpoint import Journal
+from func.ocrlang import DocumentLanguages
+from func.pack import pack_folder, is_pack
+
+
+# Как часто пересматривать количество работающих процессов, секунды
+ADJUST_INTERVAL = 1.0
+
+
+class _AdaptiveLimit:
+    """Семафор, предел которого можно менять во время работы"""
+
+    def __init__(self, limit, maximum):
+        self.maximum = maximum
+        self.limit = max(1, min(limit, maximum))
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def set_limit(self, limit):
+        with self._cond:
+            self.limit = max(1, min(limit, self.maximum))
+            self._cond.notify_all()
+
+
+def _cpu_load():
+    """
+    Загрузка процессора: средняя длина очереди за минуту на одно ядро
+
+    Returns:
+        число (1.0 - все ядра заняты) или None, если os.getloadavg недоступна (Windows)
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def _ocr_task(limit, image_path, languages, memory_limit):
+    """Задача этапа OCR (выполняется в потоке, tesseract - отдельный процесс)"""
+    limit.acquire()
+    try:
+        return ocr_image_auto(image_path, languages, memory_limit)
+    finally:
+        limit.release()
+
+
+def run_pipeline(documents, output_root='done', extract_workers=None, ocr_workers=None,
+                 max_backlog=None, memory_limit=None, pack=False):
+    """
+    Извлекает изображения из документов и распознает их текст одним конвейером
+
+    Извлечение выполняется в пуле процессов, OCR - в пуле потоков
+    (каждый поток запускает tesseract). Между этапами действует
+    обратное давление: если очередь изображений на OCR длиннее
+    max_backlog, новые документы не берутся в работу. Раз в секунду
+    количество одновременно работающих экстракторов и OCR подстраивается
+    под длину очереди и загрузку процессора.
+
+    Результаты OCR каждой папки пишутся в журнал (как в
+    extract_text_from_images), а большие PDF - в журналы извлечения,
+    поэтому повторный запуск после падения продолжает с места остановки.
+
+    Args:
+        documents: список путей к документам и архивам
+        output_root: корневая папка для результатов
+        extract_workers: максимум процессов извлечения (по умолчанию половина ядер)
+        ocr_workers: максимум одновременных вызовов tesseract (по умолчанию число ядер)
+        max_backlog: максимальная очередь изображений на OCR (по умолчанию 8 на поток OCR)
+        memory_limit: потолок памяти на распознавание одного изображения в байтах
+        pack: писать результат каждого документа в контейнер <папка>.pack (func.pack);
+              изображения пишутся в него сразу при извлечении, только части
+              больших PDF собираются в папке и упаковываются после OCR
+
+    Returns:
+        словарь со сводкой: documents, images, text_files, seconds
+    """
+    cpu_count = os.cpu_count() or 1
+    extract_max = extract_workers or max(1, cpu_count // 2)
+    ocr_max = ocr_workers or cpu_count
+    max_backlog = max_backlog or ocr_max * 8
+
+    # Tesseract по умолчанию сам запускает несколько потоков на одно изображение;
+    # при параллельном OCR это только мешает
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+    tasks = plan_tasks(documents, output_root)
+
+    create_folders(tasks, output_root, pack)
+    folder_images = {}      # папка -> {имя изображения: слова}
+    folder_pending = {}     # папка -> количество изображений в очереди OCR
+    folder_documents = {}   # папка -> документы, которые в нее пишут
+    folder_journals = {}    # папка -> журнал распознанных изображений
+    folder_languages = {}   # папка -> выбор языков OCR для документа
+
+    remaining_tasks = {}
+    for task in tasks:
+        remaining_tasks[task.document] = remaining_tasks.get(task.document, 0) + 1
+        if task.kind == 'document':
+            folder_documents.setdefault(task.folder, set()).add(task.document)
+    text_files = []
+    image_count = 0
+
+    ocr_limit = _AdaptiveLimit(max(1, cpu_count - extract_max), ocr_max)
+    extract_limit = extract_max
+    extract_futures = {}
+    ocr_futures = {}
+    start_time = time.time()
+    last_adjust = start_time
+    next_task = 0
+
+    def finalize_ready():
+        for folder in list(folder_pending):
+            documents_done = all(remaining_tasks[document] == 0 for document in folder_documents[folder])
+            if folder_pending[folder] == 0 and documents_done:
+                results = sorted(folder_images.pop(folder).items())
+                del folder_pending[folder]
+                output_file = save_folder_text(folder, results)
+                folder_journals.pop(folder).remove()
+                folder_languages.pop(folder)
+                if pack and not is_pack(folder):
+                    pack_path = pack_folder(folder)
+                    if output_file:
+                        output_file = os.path.join(pack_path, os.path.basename(output_file))
+                if output_file:
+                    text_files.append(output_file)
+                    print(f"Текст сохранен в: {output_file}")
+
+    try:
+        with ProcessPoolExecutor(max_workers=extract_max) as extract_pool, \
+                ThreadPoolExecutor(max_workers=ocr_max) as ocr_pool:
+            while next_task < len(tasks) or extract_futures or ocr_futures:
+                # Берем новые документы, пока очередь OCR не переполнена
+                while (next_task < len(tasks) and len(extract_futures) < extract_limit
+                       and len(ocr_futures) < max_backlog):
+                    task = tasks[next_task]
+                    extract_futures[extract_pool.submit(extract_task, task, output_root, pack)] = task
+                    next_task += 1
+
+                done, _ = wait(list(extract_futures) + list(ocr_futures),
+                               timeout=ADJUST_INTERVAL, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in extract_futures:
+                        task = extract_futures.pop(future)
+                        remaining_tasks[task.document] -= 1
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = ExtractResult(task.format, [], [], str(e))
+                        for message in result.messages:
+                            print(message)
+                        if result.error:
+                            print(f"Ошибка при извлечении изображений из {task.path}: {result.error}")
+                        for folder, images in result.folders:
+                            folder_documents.setdefault(folder, set()).add(task.document)
+                            folder_images.setdefault(folder, {})
+                            folder_pending.setdefault(folder, 0)
+                            if folder not in folder_journals:
+                                folder_journals[folder] = Journal(ocr_journal_path(folder))
+                                folder_languages[folder] = DocumentLanguages(folder)
+                            finished = load_ocr_journal(folder_journals[folder])
+                            for image_path in images:
+                                image_count += 1
+                                image_name = os.path.basename(image_path)
+                                if image_name in finished:
+                                    # Распознано до прерывания предыдущего запуска
+                                    folder_images[folder][image_name] = finished[image_name]
+                                    continue
+                                folder_pending[folder] += 1
+                                ocr_futures[ocr_pool.submit(_ocr_task, ocr_limit, image_path,
+                                                           folder_languages[folder], memory_limit)] = image_path
+                    else:
+                        image_path = ocr_futures.pop(future)
+                        folder = os.path.dirname(image_path)
+                        folder_pending[folder] -= 1
+                        try:
+                            words = future.result()
+                            folder_images[folder][os.path.basename(image_path)] = words
+                            folder_journals[folder].append({'image': os.path.basename(image_path), 'words': words})
+                        except Exception as e:
+                            print(f"Ошибка при обработке {image_path}: {e}")
+
+                finalize_ready()
+
+                # Подстраиваем количество работников под очередь и загрузку процессора
+                now = time.time()
+                if now - last_adjust >= ADJUST_INTERVAL:
+                    last_adjust = now
+                    backlog = len(ocr_futures)
+                    load = _cpu_load()
+
+                    if backlog > ocr_limit.limit and (load is None or load < 1.0):
+                        ocr_limit.set_limit(ocr_limit.limit + 1)
+                    elif load is not None and load > 1.25:
+                        ocr_limit.set_limit(ocr_limit.limit - 1)
+
+                    if backlog >= max_backlog // 2:
+                        # OCR не успевает - меньше процессов на извлечение
+                        extract_limit = max(1, extract_limit - 1)
+                    elif backlog < ocr_limit.limit and (load is None or load < 1.0):
+                        # OCR простаивает - больше процессов на извлечение
+                        extract_limit = min(extract_max, extract_limit + 1)
+    finally:
+        # Незавершенные журналы остаются на диске для следующего запуска
+        for journal in folder_journals.values():
+            journal.close()
+
+    seconds = time.time() - start_time
+    print(f"Документов: {len(remaining_tasks)}, изображений: {image_count}, "
+          f"текстовых файлов: {len(text_files)}, время: {seconds:.1f} с")
+    return {
+        'documents': len(remaining_tasks),
+        'images': image_count,
+        'text_files': text_files,
+        'seconds': seconds,
+    }
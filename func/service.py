@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import socket
+import itertools
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytesseract
+
+from func.ocrdata import words_to_text
+from func.ocrlang import DocumentLanguages, available_languages
+from func.imgtotext import ocr_image, ocr_image_auto, save_folder_text
+from func.tasks import plan_tasks, create_folders, extract_task
+from func.pack import pack_folder, is_pack
+
+
+DEFAULT_PORT = 8765
+
+# Сколько завершенных заданий хранить для запросов состояния
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    """
+    Задание службы: один документ или архив
+
+    События задания (извлечение, распознанные изображения, сохраненный
+    текст) накапливаются в списке events, клиенты читают их потоком.
+    """
+
+    def __init__(self, job_id, path, output_root, lang=None, pack=False):
+        self.id = job_id
+        self.path = path
+        self.output_root = output_root
+        self.lang = lang
+        self.pack = pack
+        self.status = 'queued'
+        self.events = []
+        self.created = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    def emit(self, event, **data):
+        """Добавляет событие и будит клиентов, которые ждут новые события"""
+        with self._cond:
+            self.events.append(dict(event=event, **data))
+            self._cond.notify_all()
+
+    def finish(self, status):
+        with self._cond:
+            self.status = status
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def wait_events(self, start, timeout=None):
+        """
+        Ждет событий с номера start
+
+        Returns:
+            пару (новые события, завершено ли задание)
+        """
+        with self._cond:
+            if len(self.events) <= start and self.finished is None:
+                self._cond.wait(timeout)
+            return self.events[start:], self.finished is not None
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'path': self.path,
+            'status': self.status,
+            'events': len(self.events),
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+
+class OCRService:
+    """
+    Служба извлечения изображений и OCR с заранее запущенными работниками
+
+    Пул процессов извлечения и пул потоков OCR создаются один раз при
+    запуске и используются всеми заданиями, поэтому задание не платит
+    за запуск интерпретатора, импорт модулей и проверку зависимостей.
+
+    Args:
+        output_root: корневая папка для результатов по умолчанию
+        jobs: сколько заданий обрабатывается одновременно
+        extract_workers: процессов извлечения (по умолчанию половина ядер)
+        ocr_workers: потоков OCR (по умолчанию число ядер)
+    """
+
+    def __init__(self, output_root='done', jobs=2, extract_workers=None, ocr_workers=None):
+        cpu_count = os.cpu_count() or 1
+        self.output_root = output_root
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.running = 0
+        self.ocr_backlog = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+        # Проверяем tesseract и список моделей один раз при запуске
+        pytesseract.get_tesseract_version()
+        available_languages()
+
+        extract_workers = extract_workers or max(1, cpu_count // 2)
+        self.extract_pool = ProcessPoolExecutor(max_workers=extract_workers)
+        self.ocr_pool = ThreadPoolExecutor(max_workers=ocr_workers or cpu_count)
+        # Процессы извлечения запускаются сразу, а не при первом задании
+        for future in [self.extract_pool.submit(os.getpid) for _ in range(extract_workers)]:
+            future.result()
+
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(jobs)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, path, output_root=None, lang=None, pack=False):
+        """
+        Ставит документ в очередь
+
+        Args:
+            path: путь к документу или архиву (на машине службы)
+            output_root: папка для результатов внутри корневой папки службы
+            lang: языки Tesseract; по умолчанию определяются автоматически
+            pack: упаковать результат в контейнер <папка>.pack
+
+        Returns:
+            Job
+        """
+        job = Job(str(next(self._ids)), os.path.abspath(path), self.resolve_output_root(output_root),
+                  lang, pack)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+        self.queue.put(job)
+        return job
+
+    def resolve_output_root(self, output_root):
+        """
+        Папка результатов задания
+
+        Клиент может выбрать только подпапку корневой папки службы:
+        иначе любой, у кого есть доступ к API, мог бы писать файлы
+        от имени службы куда угодно.
+
+        Args:
+            output_root: путь относительно корневой папки службы или None
+
+        Returns:
+            путь к папке; ValueError, если она вне корневой папки
+        """
+        if not output_root:
+            return self.output_root
+        root = os.path.realpath(self.output_root)
+        path = os.path.realpath(os.path.join(root, output_root))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"output_root должен быть внутри {self.output_root}")
+        return path
+
+    def _forget_finished(self):
+        finished = [job for job in self.jobs.values() if job.finished is not None]
+        for job in sorted(finished, key=lambda job: job.finished)[:-MAX_FINISHED_JOBS]:
+            del self.jobs[job.id]
+
+    def queue_depth(self):
+        """Состояние очереди: ожидающие и выполняемые задания, изображения в очереди OCR"""
+        with self._lock:
+            return {
+                'queued': self.queue.qsize(),
+                'running': self.running,
+                'ocr_backlog': self.ocr_backlog,
+                'jobs': len(self.jobs),
+            }
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            with self._lock:
+                self.running += 1
+            job.status = 'running'
+            job.emit('started', path=job.path)
+            try:
+                self._run(job)
+                job.emit('done')
+                job.finish('done')
+            except Exception as e:
+                job.emit('error', message=str(e))
+                job.finish('error')
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    def _ocr(self, image_path, languages, lang):
+        try:
+            if languages is not None:
+                return ocr_image_auto(image_path, languages)
+            return ocr_image(image_path, lang=lang)
+        finally:
+            with self._lock:
+                self.ocr_backlog -= 1
+
+    def _run(self, job):
+        if not os.path.isfile(job.path):
+            raise FileNotFoundError(f"Файл не найден: {job.path}")
+
+        # Большие PDF делятся на части так же, как в run_pipeline
+        tasks = plan_tasks([job.path], job.output_root)
+        create_folders(tasks, job.output_root, job.pack)
+        futures = [self.extract_pool.submit(extract_task, task, job.output_root, job.pack) for task in tasks]
+
+        folders = {}
+        for future in futures:
+            result = future.result()
+            for message in result.messages:
+                print(message)
+            if result.error:
+                raise RuntimeError(result.error)
+            for folder, images in result.folders:
+                folders.setdefault(folder, []).extend(images)
+
+        for folder, images in folders.items():
+            job.emit('extracted', folder=folder, images=len(images))
+            languages = DocumentLanguages(folder) if job.lang is None else None
+            with self._lock:
+                self.ocr_backlog += len(images)
+            ocr_futures = [(image_path, self.ocr_pool.submit(self._ocr, image_path, languages, job.lang))
+                           for image_path in sorted(images)]
+
+            results = []
+            for image_path, future in ocr_futures:
+                image_name = os.path.basename(image_path)
+                try:
+                    words = future.result()
+                except Exception as e:
+                    job.emit('image_error', folder=folder, image=image_name, message=str(e))
+                    continue
+                results.append((image_name, words))
+                job.emit('image', folder=folder, image=image_name, words=len(words),
+                         text=words_to_text(words))
+
+            text_file = save_folder_text(folder, results)
+            if job.pack and not is_pack(folder):
+                folder = pack_folder(folder)
+                text_file = text_file and os.path.join(folder, os.path.basename(text_file))
+            job.emit('text', folder=folder, text_file=text_file)
+
+    def close(self):
+        """Дожидается текущих заданий и останавливает работников"""
+        for _ in self._workers:
+            self.queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self.extract_pool.shutdown()
+        self.ocr_pool.shutdown()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API службы:
+
+        POST /jobs               {"path": ..., "output_root": ..., "lang": ..., "pack": ...} -> задание
+        GET  /jobs/<id>          состояние задания
+        GET  /jobs/<id>/events   события задания потоком JSON Lines до завершения
+        GET  /queue              глубина очереди
+    """
+
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def address_string(self):
+        # У Unix сокета нет адреса клиента
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            path = request['path']
+        except (ValueError, KeyError, TypeError):
+            return self._send_json(400, {'error': 'ожидается JSON с полем path'})
+
+        try:
+            job = self.service.submit(path, request.get('output_root'), request.get('lang'),
+                                      bool(request.get('pack')))
+        except (ValueError, TypeError) as e:
+            return self._send_json(400, {'error': str(e)})
+        self._send_json(202, dict(job.summary(), queue=self.service.queue_depth()))
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ['queue']:
+            return self._send_json(200, self.service.queue_depth())
+
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.jobs.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': 'задание не найдено'})
+            if len(parts) == 2:
+                return self._send_json(200, job.summary())
+            if parts[2] == 'events':
+                return self._stream_events(job)
+
+        self._send_json(404, {'error': 'not found'})
+
+    def _stream_events(self, job):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        sent = 0
+        finished = False
+        while not finished:
+            events, finished = job.wait_events(sent, timeout=1.0)
+            if events:
+                sent += len(events)
+                self._write_chunk(b''.join(
+                    json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n' for event in events
+                ))
+        self._write_chunk(b'')
+
+
+# Unix сокеты есть не везде: в Windows socketserver не определяет Unix серверы
+UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+if UNIX_SOCKETS:
+    class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+        """HTTP сервер на локальном Unix сокете"""
+
+        daemon_threads = True
+
+        def server_bind(self):
+            if os.path.exists(self.server_address):
+                os.remove(self.server_address)
+            super().server_bind()
+
+
+def serve(service, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+    """
+    Запускает HTTP API службы на TCP порту или Unix сокете
+
+    Args:
+        service: OCRService
+        host, port: адрес TCP (по умолчанию только локальные подключения)
+        socket_path: путь к Unix сокету вместо TCP; там, где Unix сокетов
+                     нет (Windows), вызывает RuntimeError
+
+    Returns:
+        сервер; serve_forever() нужно вызвать отдельно
+    """
+    if socket_path and not UNIX_SOCKETS:
+        raise RuntimeError("Unix сокеты не поддерживаются на этой платформе, используйте TCP (--port)")
+    handler = type('Handler', (ServiceHandler,), {'service': service})
+    if socket_path:
+        return UnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Служба извлечения изображений и OCR')
+    parser.add_argument('--socket', help='путь к Unix сокету (вместо TCP)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--output', default='done', help='папка для результатов')
+    parser.add_argument('--jobs', type=int, default=2, help='заданий одновременно')
+    parser.add_argument('--extract-workers', type=int, help='процессов извлечения')
+    parser.add_argument('--ocr-workers', type=int, help='потоков OCR')
+    args = parser.parse_args(argv)
+    if args.socket and not UNIX_SOCKETS:
+        parser.error("Unix сокеты не поддерживаются на этой платформе, используйте --port")
+
+    service = OCRService(args.output, args.jobs, args.extract_workers, args.ocr_workers)
+    server = serve(service, args.host, args.port, args.socket)
+    print(f"Служба запущена: {args.socket or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
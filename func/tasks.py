@@ -0,0 +1,193 @@
+import io
+import os
+from collections import namedtuple
+from contextlib import redirect_stdout
+
+from func.formats import sniff_format, extract_images
+from func.pdftoimg import extract_images_from_pdf, pdf_page_count
+from func.archives import extract_images_from_archive, SPOOL_MAX_MEMORY
+from func.pack import FolderWriter, PackWriter, PACK_EXT
+
+
+# PDF больше этого размера делится на части по PDF_CHUNK_PAGES страниц
+PDF_SPLIT_SIZE = 20 * 1024 * 1024
+PDF_CHUNK_PAGES = 50
+
+# Сколько файлов одновременно держит открытыми одна задача:
+# документ и записываемое изображение; для архива еще временный файл члена
+FILES_PER_DOCUMENT = 2
+FILES_PER_ARCHIVE = 3
+
+# Задача извлечения:
+#   document - номер документа в списке, переданном plan_tasks
+#   path     - путь к документу
+#   format   - формат, определенный по содержимому
+#   kind     - 'archive' или 'document'
+#   folder   - папка для результатов (для архива папки выбираются по членам)
+#   pages    - страницы части большого PDF или None
+#   size     - доля документа в байтах (для сортировки)
+#   files    - сколько файлов задача держит открытыми
+#   memory   - грубая оценка памяти задачи в байтах
+ExtractTask = namedtuple('ExtractTask', 'document path format kind folder pages size files memory')
+
+# Результат задачи извлечения:
+#   format   - формат документа
+#   folders  - список пар (папка, изображения)
+#   messages - сообщения экстракторов (предупреждения и ошибки отдельных изображений)
+#   error    - текст ошибки, если задачу выполнить не удалось, иначе None
+ExtractResult = namedtuple('ExtractResult', 'format folders messages error')
+
+
+def plan_tasks(documents, output_root='done', errors=None):
+    """
+    Разбивает документы на задачи извлечения
+
+    Формат определяется по содержимому: архивы ZIP/TAR обрабатываются
+    одной задачей, большие PDF делятся на части по страницам. Задачи
+    отсортированы по убыванию размера, чтобы самые долгие начинались
+    первыми. Общий планировщик для run_pipeline, extract_many и службы.
+
+    Папки результатов уникальны в пределах плана: у документов с одинаковым
+    именем (x/doc.pdf и y/doc.docx) к имени папки добавляется расширение,
+    а если и его не хватает - номер (doc, doc_docx, doc_docx_2).
+
+    Args:
+        documents: список путей к документам и архивам
+        output_root: корневая папка для результатов
+        errors: словарь для ошибок чтения документов {номер: текст};
+                если не задан, такая ошибка прерывает планирование
+
+    Returns:
+        список ExtractTask
+    """
+    tasks = []
+    used_folders = set()
+    for index, path in enumerate(documents):
+        try:
+            size = os.path.getsize(path)
+            file_format = sniff_format(path)
+        except OSError as e:
+            if errors is None:
+                raise
+            errors[index] = f"{type(e).__name__}: {e}"
+            continue
+        stem, extension = os.path.splitext(os.path.basename(path))
+        output_folder = os.path.join(output_root, stem)
+
+        if file_format in ('zip', 'tar'):
+            # Члены архива до SPOOL_MAX_MEMORY читаются в память;
+            # папки для членов выбирает extract_images_from_archive
+            tasks.append(ExtractTask(index, path, file_format, 'archive', output_folder, None, size,
+                                     FILES_PER_ARCHIVE, min(size, SPOOL_MAX_MEMORY)))
+            continue
+
+        output_folder = _unique_folder(output_folder, extension, used_folders)
+
+        if file_format == 'pdf' and size > PDF_SPLIT_SIZE:
+            try:
+                page_count = pdf_page_count(path)
+            except Exception:
+                page_count = 0
+            if page_count > PDF_CHUNK_PAGES:
+                for start in range(0, page_count, PDF_CHUNK_PAGES):
+                    end = min(start + PDF_CHUNK_PAGES, page_count)
+                    # Доли частей в сумме дают ровно размер документа
+                    chunk_size = size * end // page_count - size * start // page_count
+                    pages = range(start, end)
+                    tasks.append(ExtractTask(index, path, file_format, 'document', output_folder, pages,
+                                             chunk_size, FILES_PER_DOCUMENT, chunk_size))
+                continue
+
+        tasks.append(ExtractTask(index, path, file_format, 'document', output_folder, None, size,
+                                 FILES_PER_DOCUMENT, size))
+
+    tasks.sort(key=lambda task: task.size, reverse=True)
+    return tasks
+
+
+def _unique_folder(folder, extension, used_folders):
+    """Папка, которой еще нет в used_folders (добавляется туда)"""
+    if folder in used_folders and extension:
+        # Документы с одинаковым именем, но разным расширением (a.pdf и a.docx)
+        folder += '_' + extension.lstrip('.').lower()
+    candidate = folder
+    number = 2
+    while candidate in used_folders:
+        candidate = f"{folder}_{number}"
+        number += 1
+    used_folders.add(candidate)
+    return candidate
+
+
+def create_folders(tasks, output_root='done', pack=False):
+    """
+    Создает папки результатов до запуска задач
+
+    Части одного PDF пишут в одну папку из разных процессов, поэтому
+    папки создаются один раз заранее, а extract_task их уже не создает.
+    С pack=True папка нужна только частям больших PDF, остальные
+    документы пишут прямо в контейнер.
+
+    Args:
+        tasks: список ExtractTask
+        output_root: корневая папка для результатов
+        pack: результаты пишутся прямо в контейнеры
+    """
+    os.makedirs(output_root, exist_ok=True)
+    for folder in {task.folder for task in tasks
+                   if task.kind == 'document' and (task.pages is not None or not pack)}:
+        os.makedirs(folder, exist_ok=True)
+
+
+def extract_task(task, output_root='done', pack=False):
+    """
+    Выполняет задачу извлечения (в отдельном процессе)
+
+    Формат берется из плана (планировщик читает только заголовок), папка
+    результатов должна быть создана заранее (create_folders). Сообщения
+    экстракторов перехватываются и возвращаются вместо вывода на экран.
+
+    С pack=True изображения пишутся прямо в контейнер <папка>.pack
+    (func.pack.PackWriter), и папкой результата будет контейнер. Часть
+    большого PDF так записать нельзя - части пишутся разными процессами,
+    поэтому они пишут в папку, которую упаковывают после OCR.
+
+    Args:
+        task: ExtractTask
+        output_root: корневая папка для результатов
+        pack: писать результат прямо в контейнер
+
+    Returns:
+        ExtractResult
+    """
+    output = io.StringIO()
+    folders = []
+    error = None
+
+    with redirect_stdout(output):
+        try:
+            if task.kind == 'archive':
+                grouped = {}
+                for images in extract_images_from_archive(task.path, output_root, pack).values():
+                    for image_path in images:
+                        grouped.setdefault(os.path.dirname(image_path), []).append(image_path)
+                folders = list(grouped.items())
+            else:
+                with open(task.path, 'rb') as source:
+                    if task.pages is not None:
+                        writer = FolderWriter(task.folder, create=False)
+                        images = extract_images_from_pdf(source, writer, task.pages)
+                        folders = [(task.folder, images)]
+                    elif pack:
+                        with PackWriter(task.folder + PACK_EXT) as writer:
+                            images = extract_images(source, writer, task.format)
+                        folders = [(writer.path, images)]
+                    else:
+                        writer = FolderWriter(task.folder, create=False)
+                        images = extract_images(source, writer, task.format)
+                        folders = [(task.folder, images)]
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+    messages = [line for line in output.getvalue().splitlines() if line.strip()]
+    return ExtractResult(task.format, folders, messages, error)
@@ -0,0 +1,387 @@
+import os
+import re
+import sqlite3
+import argparse
+
+from func.ocrdata import SEPARATOR
+from func.pack import is_pack, document_name, pack_member_info, read_member
+
+
+DEFAULT_INDEX = os.path.join('done', 'index.sqlite')
+
+# Заголовок изображения в итоговом .txt файле (см. format_image_text)
+_IMAGE_HEADER = re.compile(rf'\n{SEPARATOR}\nИзображение: (.*)\n{SEPARATOR}\n\n')
+_PAGE_NUMBER = re.compile(r'image_page(\d+)_')
+_TOKEN = re.compile(r'\w+')
+_CYRILLIC = re.compile(r'[а-я]')
+
+_RU_VOWELS = 'аеиоуыэюя'
+
+_RU_PERFECTIVE_GERUND_1 = ('в', 'вши', 'вшись')
+_RU_PERFECTIVE_GERUND_2 = ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись')
+_RU_ADJECTIVE = ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+                 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею')
+_RU_PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+_RU_PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+_RU_REFLEXIVE = ('ся', 'сь')
+_RU_VERB_1 = ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны',
+              'ть', 'ешь', 'нно')
+_RU_VERB_2 = ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл',
+              'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить',
+              'ыть', 'ишь', 'ую', 'ю')
+_RU_NOUN = ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+            'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях',
+            'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я')
+_RU_SUPERLATIVE = ('ейше', 'ейш')
+_RU_DERIVATIONAL = ('ость', 'ост')
+
+
+def _ru_regions(word):
+    """Возвращает начала областей RV и R2 для русского стеммера Snowball"""
+    rv = r1 = r2 = len(word)
+    for i, ch in enumerate(word):
+        if ch in _RU_VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in _RU_VOWELS and word[i - 1] in _RU_VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _RU_VOWELS and word[i - 1] in _RU_VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _ru_remove(word, rv, suffixes, after_a_ya=()):
+    """
+    Удаляет самое длинное окончание в области RV
+
+    Окончания из after_a_ya удаляются только после "а" или "я".
+    Возвращает слово без окончания или None, если окончание не найдено.
+    """
+    best = None
+    for suffix in suffixes + after_a_ya:
+        if word.endswith(suffix) and len(word) - len(suffix) >= rv:
+            if best is None or len(suffix) > len(best):
+                best = suffix
+    if best is None:
+        return None
+
+    start = len(word) - len(best)
+    if best not in suffixes:
+        if start - 1 < rv or word[start - 1] not in 'ая':
+            return None
+    return word[:start]
+
+
+def stem_russian(word):
+    """
+    Стеммер Snowball для русского языка
+
+    Args:
+        word: слово в нижнем регистре, "ё" заменена на "е"
+
+    Returns:
+        основа слова
+    """
+    rv, r2 = _ru_regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    stripped = _ru_remove(word, rv, _RU_PERFECTIVE_GERUND_2, _RU_PERFECTIVE_GERUND_1)
+    if stripped is not None:
+        word = stripped
+    else:
+        stripped = _ru_remove(word, rv, _RU_REFLEXIVE)
+        if stripped is not None:
+            word = stripped
+
+        stripped = _ru_remove(word, rv, _RU_ADJECTIVE)
+        if stripped is not None:
+            word = stripped
+            participle = _ru_remove(word, rv, _RU_PARTICIPLE_2, _RU_PARTICIPLE_1)
+            if participle is not None:
+                word = participle
+        else:
+            stripped = _ru_remove(word, rv, _RU_VERB_2, _RU_VERB_1)
+            if stripped is None:
+                stripped = _ru_remove(word, rv, _RU_NOUN)
+            if stripped is not None:
+                word = stripped
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    for suffix in _RU_DERIVATIONAL:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r2:
+            word = word[:-len(suffix)]
+            break
+
+    # Шаг 4
+    if word.endswith('нн'):
+        word = word[:-1]
+    else:
+        stripped = _ru_remove(word, rv, _RU_SUPERLATIVE)
+        if stripped is not None:
+            word = stripped
+            if word.endswith('нн'):
+                word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+
+    return word
+
+
+def stem_english(word):
+    """
+    Упрощенный стеммер для английского языка: убирает множественное число,
+    окончания -ing, -ed и -ly
+
+    Args:
+        word: слово в нижнем регистре
+
+    Returns:
+        основа слова
+    """
+    if len(word) <= 3:
+        return word
+    if word.endswith('sses'):
+        return word[:-2]
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    for suffix in ('ing', 'edly', 'ed', 'ly'):
+        stem = word[:-len(suffix)]
+        if word.endswith(suffix) and len(stem) >= 3 and re.search('[aeiouy]', stem):
+            return stem
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def normalize_terms(text):
+    """
+    Разбивает текст на термы: нижний регистр, "ё" -> "е", стемминг
+    для русских и английских слов
+
+    Args:
+        text: исходный текст
+
+    Returns:
+        список термов
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower().replace('ё', 'е')):
+        if token.isdigit() or '_' in token:
+            terms.append(token)
+        elif _CYRILLIC.search(token):
+            terms.append(stem_russian(token))
+        else:
+            terms.append(stem_english(token))
+    return terms
+
+
+def split_image_texts(txt_path):
+    """
+    Разбивает итоговый .txt файл на тексты отдельных изображений
+
+    Args:
+        txt_path: путь к файлу, созданному extract_text_from_images
+                  (в том числе внутри контейнера .pack)
+
+    Returns:
+        список пар (имя изображения, текст)
+    """
+    content = read_member(txt_path).decode('utf-8')
+
+    parts = _IMAGE_HEADER.split(content)
+    # parts = [до первого заголовка, имя1, текст1, имя2, текст2, ...]
+    return [(parts[i], parts[i + 1].strip()) for i in range(1, len(parts) - 1, 2)]
+
+
+def open_index(index_path=DEFAULT_INDEX):
+    """
+    Открывает (и при необходимости создает) поисковый индекс SQLite FTS5
+
+    Args:
+        index_path: путь к файлу индекса
+
+    Returns:
+        соединение sqlite3
+    """
+    folder = os.path.dirname(index_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    conn = sqlite3.connect(index_path)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS documents ('
+        'id INTEGER PRIMARY KEY, folder TEXT UNIQUE, mtime REAL, size INTEGER)'
+    )
+    # В колонке terms хранятся уже нормализованные основы слов,
+    # поэтому токенизатор только режет по пробелам и не трогает диакритику (й)
+    conn.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5('
+        'terms, text UNINDEXED, document UNINDEXED, image UNINDEXED, page UNINDEXED, '
+        'tokenize="unicode61 remove_diacritics 0")'
+    )
+    return conn
+
+
+def index_folder(conn, folder_path):
+    """
+    Добавляет в индекс текст одной папки из done/
+
+    Папка пропускается, если ее .txt файл не изменился с прошлой индексации.
+
+    Args:
+        conn: соединение из open_index
+        folder_path: путь к папке с результатом extract_text_from_images
+
+    Returns:
+        количество проиндексированных изображений (0 если папка пропущена)
+    """
+    folder_name = document_name(folder_path)
+    txt_path = os.path.join(folder_path, f'{folder_name}.txt')
+    if is_pack(folder_path):
+        # Текст лежит внутри контейнера; контейнер меняется вместе с текстом
+        if pack_member_info(folder_path, f'{folder_name}.txt') is None:
+            return 0
+        stat = os.stat(folder_path)
+    elif os.path.exists(txt_path):
+        stat = os.stat(txt_path)
+    else:
+        return 0
+
+    row = conn.execute(
+        'SELECT id, mtime, size FROM documents WHERE folder = ?', (folder_name,)
+    ).fetchone()
+    if row and row[1] == stat.st_mtime and row[2] == stat.st_size:
+        return 0
+
+    with conn:
+        if row:
+            # Текст папки пересоздан - заменяем ее записи
+            doc_id = row[0]
+            conn.execute('DELETE FROM chunks WHERE document = ?', (doc_id,))
+            conn.execute('UPDATE documents SET mtime = ?, size = ? WHERE id = ?',
+                         (stat.st_mtime, stat.st_size, doc_id))
+        else:
+            doc_id = conn.execute(
+                'INSERT INTO documents (folder, mtime, size) VALUES (?, ?, ?)',
+                (folder_name, stat.st_mtime, stat.st_size)
+            ).lastrowid
+
+        rows = []
+        for image_name, text in split_image_texts(txt_path):
+            page = _PAGE_NUMBER.search(image_name)
+            rows.append((' '.join(normalize_terms(text)), text, doc_id, image_name,
+                         int(page.group(1)) if page else None))
+        conn.executemany(
+            'INSERT INTO chunks (terms, text, document, image, page) VALUES (?, ?, ?, ?, ?)', rows
+        )
+    return len(rows)
+
+
+def update_index(base_folder='done', index_path=DEFAULT_INDEX):
+    """
+    Индексирует все новые и измененные папки в base_folder
+
+    Args:
+        base_folder: папка с результатами OCR
+        index_path: путь к файлу индекса
+
+    Returns:
+        количество проиндексированных изображений
+    """
+    from func.imgtotext import get_image_folders
+
+    conn = open_index(index_path)
+    try:
+        total = 0
+        for folder_path in sorted(get_image_folders(base_folder)):
+            total += index_folder(conn, folder_path)
+        return total
+    finally:
+        conn.close()
+
+
+def search(query, index_path=DEFAULT_INDEX, limit=20):
+    """
+    Ищет изображения, текст которых содержит все слова запроса
+
+    Args:
+        query: строка запроса на русском или английском
+        index_path: путь к файлу индекса
+        limit: максимальное количество результатов
+
+    Returns:
+        список словарей с ключами folder, image, page, snippet
+    """
+    terms = normalize_terms(query)
+    if not terms or not os.path.exists(index_path):
+        return []
+
+    match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    conn = open_index(index_path)
+    try:
+        rows = conn.execute(
+            'SELECT documents.folder, chunks.image, chunks.page, chunks.text '
+            'FROM chunks JOIN documents ON documents.id = chunks.document '
+            'WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?',
+            (f'terms : ({match})', limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    results = []
+    for folder, image, page, text in rows:
+        results.append({
+            'folder': folder,
+            'image': image,
+            'page': page,
+            'snippet': _snippet(text, terms),
+        })
+    return results
+
+
+def _snippet(text, terms):
+    """Возвращает первую строку текста, в которой встречается терм запроса"""
+    for line in text.splitlines():
+        if set(normalize_terms(line)) & set(terms):
+            return line.strip()
+    return text.strip().split('\n', 1)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Полнотекстовый поиск по результатам OCR')
+    parser.add_argument('--index', default=DEFAULT_INDEX, help='путь к файлу индекса')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='добавить в индекс новые документы')
+    build.add_argument('--base', default='done', help='папка с результатами OCR')
+
+    query = subparsers.add_parser('search', help='найти изображения по словам')
+    query.add_argument('query', nargs='+')
+    query.add_argument('--limit', type=int, default=20)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = update_index(args.base, args.index)
+        print(f"Проиндексировано изображений: {count}")
+    else:
+        results = search(' '.join(args.query), args.index, args.limit)
+        if not results:
+            print("Ничего не найдено")
+        for result in results:
+            page = f", стр. {result['page']}" if result['page'] else ''
+            print(f"{result['folder']} / {result['image']}{page}: {result['snippet']}")
+
+
+if __name__ == '__main__':
+    main()
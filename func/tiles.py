@@ -0,0 +1,344 @@
+import os
+import threading
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, JpegImagePlugin
+import pytesseract
+
+from func.ocrdata import words_from_tesseract
+from func.pack import open_image, open_member
+
+
+# Изображения больше этого числа пикселей распознаются по частям
+TILE_THRESHOLD_PIXELS = 36_000_000
+
+# Сторона части и ширина перекрытия соседних частей, пиксели
+TILE_SIZE = 4096
+TILE_OVERLAP = 256
+MIN_TILE_SIZE = 1024
+
+# Потолок памяти на распознавание одного изображения, байты
+MEMORY_LIMIT = int(os.environ.get('OCR_MEMORY_LIMIT_MB', '1024')) * 1024 * 1024
+
+# Сколько памяти tesseract примерно расходует на пиксель изображения
+TESSERACT_BYTES_PER_PIXEL = 12
+
+
+def _default_budget():
+    """Четверть физической памяти, но не меньше потолка на одно изображение"""
+    try:
+        return max(MEMORY_LIMIT, os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 4)
+    except (AttributeError, ValueError, OSError):
+        return MEMORY_LIMIT
+
+
+# Общий бюджет памяти всех одновременных вызовов OCR процесса, байты
+MEMORY_BUDGET = int(os.environ.get('OCR_MEMORY_BUDGET_MB', '0')) * 1024 * 1024 or _default_budget()
+
+# Наибольшее уменьшение JPEG при декодировании (Image.draft)
+MAX_DRAFT_SCALE = 8
+
+
+class MemoryBudget:
+    """
+    Семафор, который считает байты, а не вызовы
+
+    Каждый вызов OCR резервирует оценку своей памяти и ждет, пока
+    она не поместится в общий бюджет вместе с уже работающими. Один
+    вызов проходит всегда, даже если он один больше бюджета.
+
+    Args:
+        total: бюджет в байтах
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.used = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, size):
+        """Резервирует size байт на время блока with"""
+        size = min(size, self.total)
+        with self._cond:
+            while self.used and self.used + size > self.total:
+                self._cond.wait()
+            self.used += size
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.used -= size
+                self._cond.notify_all()
+
+
+# Бюджет, общий для всех потоков OCR (ocr_image, ocr_tiled)
+memory_budget = MemoryBudget(MEMORY_BUDGET)
+
+
+def ocr_memory(image):
+    """Оценка памяти tesseract на распознавание изображения целиком, байты"""
+    width, height = image.size
+    return width * height * TESSERACT_BYTES_PER_PIXEL
+
+
+def decoded_size(image):
+    """Объем памяти под раскодированное изображение (по заголовку, без декодирования)"""
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+def needs_tiling(image, memory_limit=None):
+    """
+    Проверяет, нужно ли распознавать изображение по частям
+
+    Args:
+        image: открытое, но еще не загруженное изображение
+        memory_limit: потолок памяти в байтах (по умолчанию MEMORY_LIMIT)
+
+    Returns:
+        True для слишком больших изображений
+    """
+    memory_limit = memory_limit or MEMORY_LIMIT
+    width, height = image.size
+    return (width * height > TILE_THRESHOLD_PIXELS
+            or width * height * TESSERACT_BYTES_PER_PIXEL > memory_limit)
+
+
+@contextmanager
+def open_large_image(image_path, memory_limit=None):
+    """
+    Открывает JPEG больше предела Pillow (Image.MAX_IMAGE_PIXELS)
+
+    Общий предел Pillow не меняется. Обходится он только для JPEG,
+    который load_bounded раскодирует в уменьшенном масштабе, и только
+    если в таком масштабе изображение укладывается в половину потолка
+    памяти; размер проверяется по заголовку, без декодирования. Для
+    остальных изображений остается Image.DecompressionBombError.
+
+    Args:
+        image_path: путь к изображению или done/doc.pack/<имя>
+        memory_limit: потолок памяти в байтах (по умолчанию MEMORY_LIMIT)
+    """
+    memory_limit = memory_limit or MEMORY_LIMIT
+    with open_member(image_path) as f:
+        try:
+            image = JpegImagePlugin.JpegImageFile(f)
+        except SyntaxError:
+            raise Image.DecompressionBombError(
+                f"{image_path}: изображение больше {2 * Image.MAX_IMAGE_PIXELS} пикселей") from None
+        with image:
+            width, height = image.size
+            if not needs_tiling(image, memory_limit) \
+                    or width * height // (MAX_DRAFT_SCALE * MAX_DRAFT_SCALE) > memory_limit // 2:
+                raise Image.DecompressionBombError(
+                    f"{image_path}: изображение {width}x{height} не помещается "
+                    f"в потолок памяти {memory_limit // (1024 * 1024)} МБ")
+            yield image
+
+
+@contextmanager
+def open_bounded(image_path, memory_limit=None):
+    """
+    Открывает изображение для OCR; JPEG больше предела Pillow - через open_large_image
+
+    Args:
+        image_path: путь к изображению или done/doc.pack/<имя>
+        memory_limit: потолок памяти в байтах (по умолчанию MEMORY_LIMIT)
+    """
+    with ExitStack() as stack:
+        try:
+            image = stack.enter_context(open_image(image_path))
+        except Image.DecompressionBombError:
+            image = stack.enter_context(open_large_image(image_path, memory_limit))
+        yield image
+
+
+def load_bounded(image, memory_limit=None):
+    """
+    Загружает изображение так, чтобы раскодированные данные уместились
+    в половину потолка памяти
+
+    JPEG декодируется сразу в оттенках серого и при необходимости
+    в уменьшенном масштабе (Image.draft, масштабы 1/2, 1/4, 1/8),
+    поэтому полноразмерная цветная копия в памяти не появляется.
+    Остальные форматы Pillow умеет раскодировать только целиком - для
+    них выводится предупреждение, если потолок будет превышен.
+
+    Args:
+        image: открытое, но еще не загруженное изображение
+        memory_limit: потолок памяти в байтах (по умолчанию MEMORY_LIMIT)
+
+    Returns:
+        масштаб: во сколько раз раскодированное изображение меньше исходного
+    """
+    memory_limit = memory_limit or MEMORY_LIMIT
+    width, height = image.size
+    budget = memory_limit // 2
+
+    scale = 1
+    if image.format == 'JPEG':
+        # Для OCR достаточно оттенков серого - декодируем сразу в них
+        mode = 'L' if image.mode in ('L', 'RGB') else image.mode
+        pixel_size = 1 if mode == 'L' else len(image.getbands())
+        while width * height * pixel_size // (scale * scale) > budget and scale < MAX_DRAFT_SCALE:
+            scale *= 2
+        image.draft(mode, (width // scale, height // scale))
+        scale = width / image.size[0]
+    elif decoded_size(image) > budget:
+        print(f"Изображение {width}x{height} будет раскодировано целиком: "
+              f"{decoded_size(image) // (1024 * 1024)} МБ при потолке {memory_limit // (1024 * 1024)} МБ")
+
+    image.load()
+    return scale
+
+
+def plan_tiles(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """
+    Делит изображение на перекрывающиеся части
+
+    Returns:
+        список пар (часть, ядро): прямоугольники (left, top, right, bottom);
+        ядра частей не перекрываются и вместе покрывают все изображение
+    """
+    step = tile_size - overlap
+    lefts = list(range(0, max(width - overlap, 1), step))
+    tops = list(range(0, max(height - overlap, 1), step))
+
+    tiles = []
+    for top in tops:
+        for left in lefts:
+            right = min(left + tile_size, width)
+            bottom = min(top + tile_size, height)
+            # Граница ядра - середина перекрытия с соседней частью
+            core = (
+                left + overlap // 2 if left > 0 else 0,
+                top + overlap // 2 if top > 0 else 0,
+                right - overlap // 2 if right < width else width,
+                bottom - overlap // 2 if bottom < height else height,
+            )
+            tiles.append(((left, top, right, bottom), core))
+    return tiles
+
+
+def _ocr_tile(image, tile, lang):
+    """Распознает часть изображения и переводит координаты слов в координаты изображения"""
+    left, top = tile[:2]
+    part = image.crop(tile)
+    try:
+        data = pytesseract.image_to_data(part, lang=lang, output_type=pytesseract.Output.DICT)
+    finally:
+        part.close()
+    return [
+        (block, par, line, word, x + left, y + top, w, h, conf, text)
+        for block, par, line, word, x, y, w, h, conf, text in words_from_tesseract(data)
+    ]
+
+
+def _overlap_ratio(a, b):
+    """Доля площади меньшего из двух слов, которую занимает их пересечение"""
+    ax, ay, aw, ah = a[4:8]
+    bx, by, bw, bh = b[4:8]
+    dx = min(ax + aw, bx + bw) - max(ax, bx)
+    dy = min(ay + ah, by + bh) - max(ay, by)
+    if dx <= 0 or dy <= 0:
+        return 0.0
+    return dx * dy / max(1, min(aw * ah, bw * bh))
+
+
+def merge_tile_words(tile_words, tiles, overlap=TILE_OVERLAP):
+    """
+    Объединяет слова всех частей в один список без повторов
+
+    Слово остается только в той части, в ядро которой попадает его центр.
+    Оставшиеся повторы (слово по-разному разрезано границами частей)
+    убираются по пересечению рамок одинаковых слов - остается слово
+    с большей уверенностью. Номера блоков перенумеровываются подряд.
+
+    Args:
+        tile_words: списки слов каждой части в координатах изображения
+        tiles: список пар (часть, ядро) из plan_tiles
+        overlap: ширина перекрытия
+
+    Returns:
+        список слов в формате words_from_tesseract
+    """
+    merged = []
+    blocks = {}
+    for index, (words, (_, core)) in enumerate(zip(tile_words, tiles)):
+        for word in words:
+            center_x = word[4] + word[6] // 2
+            center_y = word[5] + word[7] // 2
+            if not (core[0] <= center_x < core[2] and core[1] <= center_y < core[3]):
+                continue
+            block = blocks.setdefault((index, word[0]), len(blocks) + 1)
+            merged.append((block,) + word[1:])
+
+    # Повторы ищем только среди соседних слов: сетка с шагом в ширину перекрытия
+    cell = max(1, overlap)
+    grid = {}
+    dropped = set()
+    for i, word in enumerate(merged):
+        key = ((word[4] + word[6] // 2) // cell, (word[5] + word[7] // 2) // cell)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((key[0] + dx, key[1] + dy), ()):
+                    if j in dropped or merged[j][0] == word[0]:
+                        continue
+                    other = merged[j]
+                    if other[9].casefold() == word[9].casefold() and _overlap_ratio(word, other) > 0.5:
+                        dropped.add(j if other[8] < word[8] else i)
+        grid.setdefault(key, []).append(i)
+
+    return [word for i, word in enumerate(merged) if i not in dropped]
+
+
+def ocr_tiled(image, lang='rus+eng', memory_limit=None, workers=None):
+    """
+    Распознает большое изображение по перекрывающимся частям в нескольких потоках
+
+    Размер частей и количество одновременных вызовов tesseract
+    подбираются так, чтобы раскодированное изображение и все
+    распознаваемые части вместе уложились в потолок памяти. Потолок
+    резервируется в общем бюджете memory_budget до декодирования.
+
+    Args:
+        image: открытое, но еще не загруженное изображение
+        lang: языки Tesseract
+        memory_limit: потолок памяти в байтах (по умолчанию MEMORY_LIMIT)
+        workers: максимум одновременных вызовов tesseract (по умолчанию число ядер)
+
+    Returns:
+        список слов в формате words_from_tesseract в координатах исходного изображения
+    """
+    memory_limit = memory_limit or MEMORY_LIMIT
+    with memory_budget.reserve(memory_limit):
+        return _ocr_tiled(image, lang, memory_limit, workers)
+
+
+def _ocr_tiled(image, lang, memory_limit, workers):
+    scale = load_bounded(image, memory_limit)
+    width, height = image.size
+
+    available = max(memory_limit - decoded_size(image), 0)
+    tile_size = TILE_SIZE
+    while tile_size > MIN_TILE_SIZE and tile_size * tile_size * TESSERACT_BYTES_PER_PIXEL > available:
+        tile_size //= 2
+    tile_cost = tile_size * tile_size * TESSERACT_BYTES_PER_PIXEL
+    workers = max(1, min(workers or os.cpu_count() or 1, available // tile_cost))
+
+    tiles = plan_tiles(width, height, tile_size)
+    print(f"Изображение {width}x{height}: {len(tiles)} частей по {tile_size} пикселей, потоков: {workers}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        tile_words = list(pool.map(lambda tile: _ocr_tile(image, tile[0], lang), tiles))
+
+    words = merge_tile_words(tile_words, tiles)
+    if scale != 1:
+        # JPEG был раскодирован в уменьшенном масштабе
+        words = [
+            word[:4] + tuple(int(round(value * scale)) for value in word[4:8]) + word[8:]
+            for word in words
+        ]
+    return words
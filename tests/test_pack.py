@@ -0,0 +1,49 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from func.archives import extract_images_from_archive
+from func.formats import extract_images
+from func.pack import PackWriter, PACK_EXT
+from tests.test_service import _make_docx
+
+
+class PackIntoMissingFolderTestCase(unittest.TestCase):
+    """Контейнер пишется в корневую папку, которой еще нет"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.document = os.path.join(self.folder, 'doc.docx')
+        _make_docx(self.document)
+        self.output_root = os.path.join(self.folder, 'done', 'nested')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_pack_writer_creates_folder(self):
+        with open(self.document, 'rb') as source:
+            with PackWriter(os.path.join(self.output_root, 'doc' + PACK_EXT)) as writer:
+                images = extract_images(source, writer, 'docx')
+        self.assertEqual(len(images), 2)
+        with zipfile.ZipFile(writer.path) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['image1.png', 'image2.png'])
+
+    def test_nested_archive_packs_into_missing_folder(self):
+        inner = io.BytesIO()
+        with tarfile.open(fileobj=inner, mode='w:gz') as archive:
+            archive.add(self.document, arcname='docs/doc.docx')
+        bundle = os.path.join(self.folder, 'bundle.zip')
+        with zipfile.ZipFile(bundle, 'w') as archive:
+            archive.writestr('inner.tar.gz', inner.getvalue())
+
+        results = extract_images_from_archive(bundle, self.output_root, pack=True)
+        self.assertEqual([len(images) for images in results.values()], [2])
+        self.assertEqual(os.listdir(self.output_root), ['bundle_inner_docs_doc' + PACK_EXT])
+
+
+if __name__ == '__main__':
+    unittest.main()
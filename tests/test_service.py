@@ -0,0 +1,176 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+import subprocess
+import http.client
+from unittest import mock
+
+from PIL import Image
+
+from func import ocrlang
+from func.service import OCRService, serve, UNIX_SOCKETS
+from func.client import ServiceClient
+
+
+def _image_to_data(image, lang=None, config='', output_type=None):
+    """Заглушка pytesseract.image_to_data: одно слово на изображение"""
+    return {
+        'level': [5], 'text': ['слово'], 'block_num': [1], 'par_num': [1], 'line_num': [1],
+        'word_num': [1], 'left': [0], 'top': [0], 'width': [10], 'height': [10], 'conf': [90],
+    }
+
+
+def _make_docx(path, images=2):
+    """Минимальный .docx с PNG изображениями в word/media"""
+    data = io.BytesIO()
+    Image.new('RGB', (40, 40), 'white').save(data, 'PNG')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('[Content_Types].xml', '<Types/>')
+        archive.writestr('word/document.xml', '<document/>')
+        for i in range(images):
+            archive.writestr(f'word/media/image{i + 1}.png', data.getvalue())
+
+
+class ServiceTestCase(unittest.TestCase):
+    """Служба с заглушкой tesseract на TCP порту и на Unix сокете"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.patches = [
+            mock.patch('pytesseract.get_tesseract_version', return_value='5.0.0'),
+            mock.patch('pytesseract.get_languages', return_value=['rus', 'eng']),
+            mock.patch('pytesseract.image_to_string', return_value='Текст документа на русском языке'),
+            mock.patch('pytesseract.image_to_data', side_effect=_image_to_data),
+        ]
+        for patch in cls.patches:
+            patch.start()
+        ocrlang.available_languages.cache_clear()
+
+        cls.document = os.path.join(cls.folder, 'doc.docx')
+        _make_docx(cls.document)
+
+        cls.service = OCRService(os.path.join(cls.folder, 'done'), jobs=1, extract_workers=1, ocr_workers=2)
+        cls.socket_path = os.path.join(cls.folder, 'ocr.sock')
+        cls.servers = [serve(cls.service, port=0)]
+        if UNIX_SOCKETS:
+            cls.servers.append(serve(cls.service, socket_path=cls.socket_path))
+        for server in cls.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        cls.port = cls.servers[0].server_address[1]
+        cls.clients = {'tcp': ServiceClient(f'http://127.0.0.1:{cls.port}', timeout=30)}
+        if UNIX_SOCKETS:
+            cls.clients['unix'] = ServiceClient(socket_path=cls.socket_path, timeout=30)
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers:
+            server.shutdown()
+            server.server_close()
+        cls.service.close()
+        for patch in cls.patches:
+            patch.stop()
+        ocrlang.available_languages.cache_clear()
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def test_submit_streams_events_until_done(self):
+        for transport, client in self.clients.items():
+            with self.subTest(transport=transport):
+                job = client.submit(self.document, output_root=transport)
+                self.assertIn('queue', job)
+
+                events = list(client.events(job['id']))
+                kinds = [event['event'] for event in events]
+                self.assertEqual(kinds[0], 'started')
+                self.assertEqual(kinds[-1], 'done')
+                self.assertEqual(kinds.count('image'), 2)
+                self.assertTrue(all(event['text'] == 'слово' for event in events if event['event'] == 'image'))
+
+                text_event = next(event for event in events if event['event'] == 'text')
+                self.assertTrue(os.path.isfile(text_event['text_file']))
+                self.assertEqual(client.status(job['id'])['status'], 'done')
+
+    def test_pack_writes_straight_into_container(self):
+        client = self.clients.get('unix', self.clients['tcp'])
+        job = client.submit(self.document, output_root='packed', pack=True)
+        events = list(client.events(job['id']))
+        self.assertEqual(events[-1]['event'], 'done')
+
+        output_root = os.path.join(self.folder, 'done', 'packed')
+        self.assertEqual(sorted(name for name in os.listdir(output_root) if not name.endswith('.json')),
+                         ['doc.pack'])
+        with zipfile.ZipFile(os.path.join(output_root, 'doc.pack')) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['doc.npz', 'doc.txt', 'image1.png', 'image2.png'])
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist()))
+
+    def test_missing_path_ends_with_error(self):
+        for transport, client in self.clients.items():
+            with self.subTest(transport=transport):
+                job = client.submit(os.path.join(self.folder, 'missing.pdf'))
+                events = list(client.events(job['id']))
+                self.assertEqual(events[-1]['event'], 'error')
+                self.assertIn('missing.pdf', events[-1]['message'])
+                self.assertEqual(client.status(job['id'])['status'], 'error')
+
+    def test_queue_depth(self):
+        for transport, client in self.clients.items():
+            with self.subTest(transport=transport):
+                depth = client.queue_depth()
+                self.assertEqual(set(depth), {'queued', 'running', 'ocr_backlog', 'jobs'})
+
+    def test_unknown_job_is_404(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            connection.request('GET', '/jobs/unknown')
+            self.assertEqual(connection.getresponse().status, 404)
+        finally:
+            connection.close()
+        for transport, client in self.clients.items():
+            with self.subTest(transport=transport):
+                with self.assertRaises(RuntimeError):
+                    client.status('unknown')
+                with self.assertRaises(RuntimeError):
+                    list(client.events('unknown'))
+
+    def test_output_root_outside_service_folder_is_rejected(self):
+        for transport, client in self.clients.items():
+            with self.subTest(transport=transport):
+                for output_root in ('../outside', self.folder):
+                    with self.assertRaises(RuntimeError):
+                        client.submit(self.document, output_root=output_root)
+
+
+class NoUnixSocketsTestCase(unittest.TestCase):
+    """Без Unix сокетов (Windows) служба и клиент импортируются и работают по TCP"""
+
+    def test_import_and_clear_error_without_af_unix(self):
+        script = (
+            "import socket\n"
+            "del socket.AF_UNIX\n"
+            "from func.service import OCRService, serve, UNIX_SOCKETS\n"
+            "from func.client import ServiceClient\n"
+            "assert not UNIX_SOCKETS\n"
+            "for call in (lambda: serve(None, socket_path='ocr.sock'),\n"
+            "             lambda: ServiceClient(socket_path='ocr.sock')):\n"
+            "    try:\n"
+            "        call()\n"
+            "    except RuntimeError as e:\n"
+            "        assert 'Unix' in str(e)\n"
+            "    else:\n"
+            "        raise AssertionError('RuntimeError expected')\n"
+            "server = serve(None, port=0)\n"
+            "server.server_close()\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
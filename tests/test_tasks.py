@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from PIL import Image
+
+from func.batch import extract_many
+from func.tasks import plan_tasks
+from tests.test_service import _make_docx
+
+
+class SameNameDocumentsTestCase(unittest.TestCase):
+    """Документы с одинаковым именем получают разные папки результатов"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.documents = [os.path.join(self.folder, 'x', 'doc.pdf'),
+                          os.path.join(self.folder, 'y', 'doc.docx'),
+                          os.path.join(self.folder, 'doc.docx')]
+        for path in self.documents:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', (40, 40), 'red').save(self.documents[0])
+        _make_docx(self.documents[1], images=2)
+        _make_docx(self.documents[2], images=1)
+        self.output_root = os.path.join(self.folder, 'done')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_plan_folders_are_unique(self):
+        folders = {task.document: task.folder for task in plan_tasks(self.documents, self.output_root)}
+        self.assertEqual([os.path.basename(folders[index]) for index in range(3)],
+                         ['doc', 'doc_docx', 'doc_docx_2'])
+
+    def test_extract_many_keeps_documents_apart(self):
+        for pack in (False, True):
+            with self.subTest(pack=pack):
+                summary = extract_many(self.documents, os.path.join(self.output_root, str(pack)),
+                                       workers=2, pack=pack)
+                results = summary['results']
+                self.assertEqual([result.error for result in results], [None, None, None])
+                self.assertEqual([len(result.images) for result in results], [1, 2, 1])
+                self.assertEqual(len({folder for result in results for folder in result.folders}), 3)
+                for result in results:
+                    self.assertEqual(len(result.folders), 1)
+                    folder = result.folders[0]
+                    if pack:
+                        with zipfile.ZipFile(folder) as archive:
+                            names = archive.namelist()
+                    else:
+                        names = os.listdir(folder)
+                    self.assertEqual(sorted(os.path.basename(image) for image in result.images),
+                                     sorted(name for name in names if not name.endswith('.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()